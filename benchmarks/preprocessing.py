@@ -0,0 +1,59 @@
+"""
+Time each preprocessing stage on its own and the fused pipeline as a whole.
+
+    python benchmarks/preprocessing.py [--image path/to/source.jpg] [--repeat 10]
+"""
+
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+from PIL import Image
+
+from piframe import image_utils, preprocessing
+from piframe.hardware import display
+from scale_and_crop import synthetic_image
+
+STAGES = [
+    preprocessing.Saturation(),
+    preprocessing.Contrast(),
+    preprocessing.Gamma(),
+    preprocessing.PaletteToneMap(),
+    preprocessing.UnsharpMask(),
+]
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--image", help="Source image, defaults to synthetic content")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    source = Image.open(args.image) if args.image else synthetic_image(1536, 1024)
+    image = image_utils.scale_and_crop(source, display.WIDTH, display.HEIGHT)
+    pixels = np.asarray(image, dtype=np.float32)
+
+    for stage in STAGES:
+        seconds = best_of(lambda: stage.apply(pixels), args.repeat)
+        print(f"{type(stage).__name__:<34}{seconds * 1000:>8.1f} ms")
+
+    unfused = sum(best_of(lambda: s.apply(pixels), args.repeat) for s in STAGES)
+    pipeline = preprocessing.Pipeline(STAGES)
+    fused = best_of(lambda: pipeline.apply(image), args.repeat)
+    print(f"{'sum of stages':<34}{unfused * 1000:>8.1f} ms")
+    print(f"{'fused pipeline (incl. conversion)':<34}{fused * 1000:>8.1f} ms")
+    for name, seconds in pipeline.timings.items():
+        print(f"  {name:<32}{seconds * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
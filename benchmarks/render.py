@@ -0,0 +1,68 @@
+"""
+Time the full render path, from a provider-sized image to a refreshed display,
+against the virtual display so it can run off-device.
+
+    python benchmarks/render.py [--image path/to/source.jpg] [--dither diffusion]
+"""
+
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from PIL import Image
+
+from piframe import image_utils
+from piframe.hardware import display
+from piframe.hardware.virtual_display import VirtualDisplay
+from scale_and_crop import synthetic_image
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--image", help="Source image, defaults to synthetic content")
+    parser.add_argument("--dither", default="diffusion")
+    parser.add_argument("--mode", default="full")
+    parser.add_argument("--realtime", action="store_true")
+    parser.add_argument("--preview", default=None, help="Where to write the PNG")
+    args = parser.parse_args()
+
+    image = (
+        Image.open(args.image).convert("RGB")
+        if args.image
+        else synthetic_image(1536, 1024)
+    )
+    backend = VirtualDisplay(preview_path=args.preview, realtime=args.realtime)
+    timings = {}
+
+    start = time.perf_counter()
+    display_image = image_utils.scale_and_crop(image, display.WIDTH, display.HEIGHT)
+    timings["scale_and_crop"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    display_image = image_utils.overlay_prompt(display_image, "A benchmark title")
+    timings["overlay"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    framebuffer = display.get_framebuffer(display_image, args.dither)
+    timings["quantize"] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "frame.fb"
+        start = time.perf_counter()
+        display.save_framebuffer(framebuffer, path)
+        framebuffer = display.load_framebuffer(path)
+        timings["framebuffer_io"] = time.perf_counter() - start
+
+        phases = display.render_framebuffer(
+            framebuffer, args.mode, force=True, backend=backend
+        )
+
+    for name, seconds in timings.items():
+        print(f"{name:<16}{seconds * 1000:>10.1f} ms")
+    for name, seconds in phases.items():
+        print(f"display.{name:<8}{seconds * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
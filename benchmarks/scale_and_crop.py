@@ -0,0 +1,106 @@
+"""
+Compare image_utils.scale_and_crop against the previous resize-then-crop version.
+
+    python benchmarks/scale_and_crop.py [--image path/to/source.jpg] [--repeat 10]
+"""
+
+import math
+import time
+from argparse import ArgumentParser
+
+from PIL import Image, ImageChops, ImageStat
+
+from piframe import image_utils
+
+# Output sizes of the configured image providers
+PROVIDER_RESOLUTIONS = {
+    "openai": (1536, 1024),
+    "titan": (1280, 768),
+    "sdxl": (1024, 1024),
+    "sd3 16:9": (1344, 768),
+    "sd3 21:9": (1536, 640),
+    "ultra 3:2": (1216, 832),
+}
+
+
+def legacy_scale_and_crop(
+    img: Image.Image,
+    target_width: int,
+    target_height: int,
+    resample: int = Image.LANCZOS,
+) -> Image.Image:
+    img_ratio = img.width / img.height
+    target_ratio = target_width / target_height
+
+    if img_ratio > target_ratio:
+        new_height = target_height
+        new_width = int(img.width * (target_height / img.height))
+    else:
+        new_width = target_width
+        new_height = int(img.height * (target_width / img.width))
+
+    resized_img = img.resize((new_width, new_height), resample)
+
+    left = (new_width - target_width) / 2
+    top = (new_height - target_height) / 2
+    return resized_img.crop((left, top, left + target_width, top + target_height))
+
+
+def synthetic_image(width: int, height: int) -> Image.Image:
+    """Detailed test content: fractal luminance over color gradients."""
+    detail = Image.effect_mandelbrot((width, height), (-2.0, -1.2, 1.0, 1.2), 100)
+    red = Image.linear_gradient("L").resize((width, height))
+    blue = red.transpose(Image.Transpose.ROTATE_90).resize((width, height))
+    return Image.merge("RGB", (red, detail, blue))
+
+
+def psnr(a: Image.Image, b: Image.Image) -> float:
+    diff = ImageChops.difference(a, b)
+    mse = sum(rms**2 for rms in ImageStat.Stat(diff).rms) / 3
+    return float("inf") if mse == 0 else 10 * math.log10(255**2 / mse)
+
+
+def time_call(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--image", help="Source image, resized to each resolution")
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    source = Image.open(args.image).convert("RGB") if args.image else None
+    print(
+        f"{'provider':<12}{'source':>12}{'legacy ms':>12}{'box ms':>10}{'speedup':>9}{'PSNR dB':>9}"
+    )
+    for name, (width, height) in PROVIDER_RESOLUTIONS.items():
+        image = (
+            source.resize((width, height), Image.LANCZOS)
+            if source
+            else synthetic_image(width, height)
+        )
+        legacy = legacy_scale_and_crop(image, args.width, args.height)
+        boxed = image_utils.scale_and_crop(image, args.width, args.height)
+        legacy_s = time_call(
+            lambda: legacy_scale_and_crop(image, args.width, args.height), args.repeat
+        )
+        boxed_s = time_call(
+            lambda: image_utils.scale_and_crop(image, args.width, args.height),
+            args.repeat,
+        )
+        print(
+            f"{name:<12}{f'{width}x{height}':>12}{legacy_s * 1000:>12.1f}"
+            f"{boxed_s * 1000:>10.1f}{legacy_s / boxed_s:>8.2f}x{psnr(legacy, boxed):>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -12,4 +12,5 @@ virtualenv .venv
 source .venv/bin/activate
 
 pip install -r requirements.txt
-pip install -e .
\ No newline at end of file
+pip install -e .
+python -m piframe.hardware.display --build-lut
@@ -1,8 +1,12 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+import asyncio
 import json
 import os
-from typing import Dict, Any
+import time
+from typing import Dict, Any, Optional
 import boto3
 from pydantic import BaseModel
 
@@ -10,7 +14,103 @@ from piframe.config import Config
 from piframe.hardware import power
 from piframe import prompts
 
-app = FastAPI()
+# Seconds between power status reads, shared by every client
+POWER_SAMPLE_INTERVAL = float(os.environ.get("PIFRAME_POWER_SAMPLE_INTERVAL", "10"))
+# Seconds between keepalive comments on an idle power stream
+POWER_STREAM_KEEPALIVE = 30.0
+
+
+# Pydantic models for request/response
+class PowerStatus(BaseModel):
+    is_battery_powered: bool
+    battery_level: float | None
+    power_status_string: str
+    # Seconds since the status was read from the hardware
+    age_seconds: float = 0.0
+
+
+def read_power_status() -> PowerStatus:
+    snapshot = power.get_power_snapshot()
+    battery_level = (
+        snapshot.charge_level / 100
+        if snapshot and snapshot.charge_level is not None
+        else None
+    )
+    is_battery = snapshot.is_battery_powered if snapshot else False
+
+    return PowerStatus(
+        is_battery_powered=is_battery,
+        battery_level=battery_level,
+        power_status_string="Battery" if is_battery else "Plugged in",
+    )
+
+
+UNAVAILABLE_POWER_STATUS = PowerStatus(
+    is_battery_powered=False, battery_level=None, power_status_string="Unavailable"
+)
+
+
+class PowerSampler:
+    """
+    Reads the power status on a worker thread every interval seconds, so
+    requests are served from memory and the I2C bus sees one reader however
+    many clients are polling.
+
+    A read that fails reports the status as unavailable. Every change bumps
+    version, so a client can tell whether it has seen the latest status.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.version = 0
+        self._status: Optional[PowerStatus] = None
+        self._sampled_at = 0.0
+        self._ready = asyncio.Event()
+        self._changed = asyncio.Condition()
+
+    async def run(self):
+        while True:
+            try:
+                status = await asyncio.to_thread(read_power_status)
+            except Exception as e:
+                print(f"Failed to read power status: {e!r}")
+                status = UNAVAILABLE_POWER_STATUS
+            self._sampled_at = time.monotonic()
+            if status != self._status:
+                self._status = status
+                self.version += 1
+                async with self._changed:
+                    self._changed.notify_all()
+            self._ready.set()
+            await asyncio.sleep(self.interval)
+
+    async def current(self) -> tuple[PowerStatus, int]:
+        """The latest status and its version."""
+        await self._ready.wait()
+        status = self._status.model_copy(
+            update={"age_seconds": round(time.monotonic() - self._sampled_at, 3)}
+        )
+        return status, self.version
+
+    async def wait_for_change(self, version: int):
+        """Wait until the status has changed since the given version."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.version != version)
+
+
+power_sampler: Optional[PowerSampler] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global power_sampler
+    power_sampler = PowerSampler(POWER_SAMPLE_INTERVAL)
+    sampler_task = asyncio.create_task(power_sampler.run())
+    yield
+    sampler_task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -24,13 +124,6 @@ app.add_middleware(
 CONFIG_PATH = "config.json"
 
 
-# Pydantic models for request/response
-class PowerStatus(BaseModel):
-    is_battery_powered: bool
-    battery_level: float | None
-    power_status_string: str
-
-
 class ConfigUpdate(BaseModel):
     config: Dict[str, Any]
 
@@ -46,14 +139,30 @@ async def get_models():
 @app.get("/api/power")
 async def get_power():
     """Get current power status"""
-    battery_level = power.get_battery_level()
-    is_battery = power.is_battery_powered()
-
-    return PowerStatus(
-        is_battery_powered=is_battery,
-        battery_level=battery_level,
-        power_status_string="Battery" if is_battery else "Plugged in",
-    )
+    status, _ = await power_sampler.current()
+    return status
+
+
+@app.get("/api/power/stream")
+async def stream_power():
+    """Server-sent events with the power status, sent whenever it changes"""
+
+    async def events():
+        status, sent_version = await power_sampler.current()
+        yield f"data: {status.model_dump_json()}\n\n"
+        while True:
+            try:
+                await asyncio.wait_for(
+                    power_sampler.wait_for_change(sent_version),
+                    POWER_STREAM_KEEPALIVE,
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            status, sent_version = await power_sampler.current()
+            yield f"data: {status.model_dump_json()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
 @app.get("/api/config")
@@ -1,29 +1,35 @@
 import csv
+import gc
 import json
 import logging
 import os
 from argparse import ArgumentParser
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Type
+from typing import Callable, Optional, Type
 
 import boto3
 from croniter import croniter
+from PIL import Image
 from unidecode import unidecode
 
-from piframe import image_utils
+from piframe import dedup, image_utils, preprocessing, schedule, scoring
 from piframe.config import Config
+from piframe.energy import EnergySampler
 from piframe.hardware import display, power
+from piframe.journal import RunJournal
 from piframe.models import Message, MessageContent, BedrockModel, StableApi, Model
 from piframe.prompts import (
+    fingerprint,
     image_description_prompt,
     image_generation_prompt,
     PromptContext,
     image_title_prompt,
 )
 from piframe.reflection import load_class, ModuleDefinition, T
-from piframe.weather import get_current_weather
+from piframe.schedule import QualityTier
 
 logging.basicConfig(level=logging.ERROR)
 
@@ -47,6 +53,28 @@ def _instantiate_model(
     return model_class(**model_args)
 
 
+def generate_candidates(
+    image_model: Model[Image.Image], image_prompt: str, count: int = 1
+) -> list[Image.Image]:
+    """Generate count images for the same prompt, in parallel when count > 1."""
+    messages = [Message(content=[MessageContent(text=image_prompt)])]
+    if count == 1:
+        return [image_model.invoke(messages)]
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(image_model.invoke, messages) for _ in range(count)]
+    candidates, errors = [], []
+    for future in futures:
+        try:
+            candidates.append(future.result())
+        except Exception as e:
+            print(f"Image candidate failed: {e!r}")
+            errors.append(e)
+    if not candidates:
+        raise errors[0]
+    return candidates
+
+
 def generate_and_render_image(config_path: str):
     with open(config_path) as config_file:
         config = Config(**json.load(config_file))
@@ -57,6 +85,51 @@ def generate_and_render_image(config_path: str):
     power.enable_display_power()
     power.set_current_time()
 
+    battery_level = log_battery_status(config)
+    tier = None
+    if (
+        config.power_budget is not None
+        and battery_level is not None
+        and power.is_battery_powered()
+    ):
+        tier = config.power_budget.select_tier(battery_level)
+    if tier is not None:
+        print(f"Battery at {battery_level:.0%}, using the {tier.name} tier.")
+        config = config.model_copy(update=tier.overrides())
+
+    journal = RunJournal(
+        trace_memory=config.trace_memory, memory_warning_mb=config.memory_warning_mb
+    )
+    journal.record(quality_tier=tier.name if tier is not None else None)
+    release_buffers = config.release_buffers
+    energy_sampler = None
+    if config.energy_sample_interval is not None:
+        energy_sampler = EnergySampler(
+            power.get_battery_power, interval=config.energy_sample_interval
+        )
+        energy_sampler.start()
+
+    display_backend = (
+        load_class(config.display)(**config.display.args) if config.display else None
+    )
+    if tier is not None and tier.archived:
+        archived_path = schedule.pick_archived(config.artifact_directory)
+        if archived_path is not None:
+            print(f"Showing archived image {archived_path}...")
+            journal.record(archived_image=archived_path.name)
+            render(
+                journal,
+                lambda: display.render_archived(
+                    archived_path, mode=config.refresh_mode, backend=display_backend
+                ),
+            )
+            finish_wake(config, journal, energy_sampler, battery_level, tier)
+            return
+        print("No archived images to show, generating one.")
+
+    weather_provider = load_class(config.weather)(**config.weather.args)
+    weather_provider.prefetch()
+
     bedrock = boto3.client(
         "bedrock-runtime",
     )
@@ -68,51 +141,157 @@ def generate_and_render_image(config_path: str):
     description_model = _instantiate_model(config.description_model, model_type_extras)
     image_model = _instantiate_model(config.image_model, model_type_extras)
 
-    prompt_history = deque(maxlen=10)
-    try:
-        with open("prompt_history.json") as f:
-            for row in map(json.loads, f):
-                prompt_history.append(row["description"])
-    except FileNotFoundError:
-        pass
-
-    battery_level = log_battery_status(config)
+    prompt_history = load_prompt_history(config)
 
     topic_strategy = load_class(config.topic_strategy)(**config.topic_strategy.args)
+    with journal.stage("weather"):
+        weather = weather_provider.get_weather()
     context = PromptContext(
-        weather=get_current_weather(),
+        weather=weather,
         battery_level=battery_level if battery_level is not None else 1.0,
         history=prompt_history,
     )
-    description_prompt = image_description_prompt(
-        topic_strategy=topic_strategy,
-        context=context,
+    description_index = (
+        load_description_index(config)
+        if config.description_similarity_threshold is not None
+        else None
     )
-    print(description_prompt)
-    image_description = description_model.invoke(
-        [Message(content=[MessageContent(text=description_prompt)])]
-    ).strip()
+    rejected_descriptions = []
+    for attempt in range(config.description_retries + 1):
+        description_prompt = image_description_prompt(
+            topic_strategy=topic_strategy,
+            context=context,
+            token_budget=description_model.prompt_tokens,
+            count_tokens=description_model.estimate_tokens,
+        )
+        print(description_prompt)
+        journal.record(
+            description_prompt_chars=len(description_prompt),
+            description_prompt_tokens=description_model.estimate_tokens(
+                description_prompt
+            ),
+        )
+        with journal.stage("description"):
+            image_description = description_model.invoke(
+                [Message(content=[MessageContent(text=description_prompt)])]
+            ).strip()
+
+        if description_index is None:
+            break
+        similarity = description_index.most_similar(image_description)
+        if similarity is None:
+            break
+        rejected_descriptions.append(round(similarity, 3))
+        if attempt < config.description_retries:
+            print(
+                f"Description is {similarity:.0%} similar to a past one, re-rolling..."
+            )
+        else:
+            print(f"Description is {similarity:.0%} similar to a past one, using it.")
+    journal.record(rejected_description_similarities=rejected_descriptions)
     title_prompt = image_title_prompt(description=image_description)
-    image_title = unidecode(
-        description_model.invoke(
-            [Message(content=[MessageContent(text=title_prompt)])]
-        ).strip()
-    )
+    with journal.stage("title"):
+        image_title = unidecode(
+            description_model.invoke(
+                [Message(content=[MessageContent(text=title_prompt)])]
+            ).strip()
+        )
     image_prompt = image_generation_prompt(image_description=image_description)
     print(f"{image_title=} {image_prompt=}")
 
-    image = image_model.invoke([Message(content=[MessageContent(text=image_prompt)])])
-    display_image = image_utils.scale_and_crop(image, 800, 480)
-    display_image = image_utils.overlay_prompt(display_image, image_title)
+    duplicate_index = (
+        dedup.HashIndex(
+            max_distance=config.duplicate_hash_distance,
+            path=Path(config.artifact_directory) / "phash.index",
+        )
+        if config.duplicate_hash_distance is not None
+        else None
+    )
+    rejected_duplicates = 0
+    for attempt in range(config.duplicate_retries + 1):
+        with journal.stage("image_generation"):
+            candidates = generate_candidates(
+                image_model, image_prompt, count=config.image_candidates
+            )
 
-    print("Rendering image...")
-    display.render(display_image)
+        with journal.stage("scale_and_crop"):
+            display_candidates = [
+                image_utils.scale_and_crop(candidate, display.WIDTH, display.HEIGHT)
+                for candidate in candidates
+            ]
+            hashes = [dedup.dhash(candidate) for candidate in display_candidates]
 
-    timestamp = datetime.now().isoformat()
+        if duplicate_index is None:
+            break
+        fresh = [i for i, h in enumerate(hashes) if not duplicate_index.is_duplicate(h)]
+        rejected_duplicates += len(candidates) - len(fresh)
+        if fresh:
+            candidates = [candidates[i] for i in fresh]
+            display_candidates = [display_candidates[i] for i in fresh]
+            hashes = [hashes[i] for i in fresh]
+            break
+        if attempt < config.duplicate_retries:
+            print("Only near-duplicates of past images were generated, retrying...")
+        else:
+            print("Only near-duplicates of past images were generated, using them.")
+    journal.record(rejected_duplicates=rejected_duplicates)
+
+    selected = 0
+    if len(candidates) > 1:
+        with journal.stage("score"):
+            scores = [
+                scoring.score_image(
+                    candidate, display.PALETTE, display.palette_lut()
+                ).total()
+                for candidate in display_candidates
+            ]
+        selected = max(range(len(scores)), key=scores.__getitem__)
+        journal.record(candidate_scores=scores, selected_candidate=selected)
+    image, display_image = candidates[selected], display_candidates[selected]
+    image_hash = hashes[selected]
+    journal.record(image_hash=f"{image_hash:016x}")
+    del candidates, display_candidates
+
+    timestamp = journal.timestamp
     images_dir = Path(config.artifact_directory) / "images"
     images_dir.mkdir(exist_ok=True)
     image_path = images_dir / f"{timestamp}.jpg"
-    image.save(image_path, quality=99)
+    with journal.stage("save_original"):
+        image.save(image_path, quality=99)
+        if release_buffers:
+            # The original is on disk now and is several times the display size
+            del image
+            gc.collect()
+    if duplicate_index is not None:
+        duplicate_index.add(image_hash)
+    if description_index is not None:
+        description_index.add(image_description)
+
+    if config.preprocessing_stages:
+        pipeline = preprocessing.Pipeline(
+            [load_class(stage)(**stage.args) for stage in config.preprocessing_stages]
+        )
+        with journal.stage("preprocess"):
+            display_image = pipeline.apply(display_image)
+        journal.record(preprocessing_timings=pipeline.timings)
+
+    with journal.stage("overlay"):
+        display_image = image_utils.overlay_prompt(display_image, image_title)
+
+    with journal.stage("quantize"):
+        framebuffer = display.get_framebuffer(display_image, dither=config.dither)
+        display.save_framebuffer(framebuffer, display.framebuffer_path(image_path))
+        if release_buffers:
+            del display_image
+            gc.collect()
+
+    print("Rendering image...")
+    render(
+        journal,
+        lambda: display.render_framebuffer(
+            framebuffer, mode=config.refresh_mode, backend=display_backend
+        ),
+    )
 
     generation_log = {
         "timestamp": timestamp,
@@ -127,15 +306,131 @@ def generate_and_render_image(config_path: str):
         log_name="piframe.log.csv",
         log_event=generation_log,
     )
+    finish_wake(config, journal, energy_sampler, battery_level, tier)
+
+
+def render(journal: RunJournal, draw: Callable[[], Optional[dict]]):
+    """
+    Runs draw in the render stage. A failed refresh, e.g. a panel stuck busy, is
+    recorded rather than raised so the wake still finishes and the alarm is set.
+    """
+    try:
+        with journal.stage("render"):
+            display_timings = draw()
+    except Exception as e:
+        print(f"Could not refresh the display: {e!r}")
+        journal.record(display_refreshed=False, display_error=repr(e))
+        return
+    journal.record(
+        display_refreshed=display_timings is not None, display_phases=display_timings
+    )
+
+
+def finish_wake(
+    config: Config,
+    journal: RunJournal,
+    energy_sampler: Optional[EnergySampler],
+    battery_level: Optional[float],
+    tier: Optional[QualityTier],
+):
+    if energy_sampler is not None:
+        energy_sampler.stop()
+        energy_sampler.annotate(journal)
+    wakeup = plan_wakeup(config, journal, battery_level, tier)
+    journal.write(config.artifact_directory)
 
-    cron = croniter(config.schedule, datetime.now())
-    wakeup = cron.get_next(datetime)
     print(f"Next wake up at {wakeup}.")
-    power.set_alarm(wakeup)
+    alarm_set = power.set_alarm(wakeup)
 
     if power.is_battery_powered():
-        print(f"Shutting down...")
-        power.shutdown()
+        if not alarm_set:
+            print("Could not set the wake alarm, staying on.")
+        else:
+            print(f"Shutting down...")
+            if not power.shutdown():
+                print("Could not set the PiJuice to power off, staying on.")
+
+
+def plan_wakeup(
+    config: Config,
+    journal: RunJournal,
+    battery_level: Optional[float],
+    tier: Optional[QualityTier],
+) -> datetime:
+    """
+    The next scheduled wake, stretched by the power budget while on battery.
+    Falls back to the schedule as is when the battery capacity is unknown.
+    """
+    budget = config.power_budget
+    capacity_j = None
+    if budget is not None and battery_level is not None and power.is_battery_powered():
+        capacity_j = budget.capacity_j(power.get_battery_capacity_mah())
+    if capacity_j is None:
+        return croniter(config.schedule, datetime.now()).get_next(datetime)
+
+    wake_energy_j = (
+        schedule.measure_wake_energy(
+            config.artifact_directory, tier.name if tier is not None else None
+        )
+        or budget.default_wake_energy_j
+    )
+    battery_log = schedule.read_battery_log(config.artifact_directory)
+    sleep_power_w = schedule.measure_sleep_power(battery_log, capacity_j, wake_energy_j)
+    if sleep_power_w is None:
+        sleep_power_w = budget.default_sleep_power_w
+    plan = schedule.plan_wakeup(
+        config.schedule,
+        budget,
+        charge=battery_level,
+        capacity_j=capacity_j,
+        wake_energy_j=wake_energy_j,
+        sleep_power_w=sleep_power_w,
+        off_charger_at=schedule.off_charger_since(battery_log),
+    )
+    journal.record(
+        planned_wake_energy_j=round(wake_energy_j, 2),
+        planned_sleep_power_w=round(sleep_power_w, 4),
+        affordable_wakes=plan.affordable_wakes,
+        scheduled_wakes=plan.scheduled_wakes,
+        skipped_wakes=plan.skipped,
+    )
+    if plan.skipped:
+        print(f"Skipping {plan.skipped} scheduled wakes to save battery.")
+    return plan.wakeup
+
+
+def load_prompt_history(config: Config, size: int = 10) -> list[str]:
+    """Fingerprints of the most recent descriptions in the generation log."""
+    history = deque(maxlen=size)
+    try:
+        with open(Path(config.artifact_directory) / "piframe.log.csv", newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("description"):
+                    history.append(
+                        fingerprint(row["description"], row.get("image_prompt"))
+                    )
+    except FileNotFoundError:
+        pass
+    return list(reversed(history))
+
+
+def load_description_index(config: Config) -> dedup.DescriptionIndex:
+    """
+    The persisted description index, seeded from the generation log the first
+    time so existing frames start out with their history.
+    """
+    path = Path(config.artifact_directory) / "description_minhash.index"
+    seed = not path.exists()
+    index = dedup.DescriptionIndex(
+        threshold=config.description_similarity_threshold, path=path
+    )
+    log_path = Path(config.artifact_directory) / "piframe.log.csv"
+    if seed and log_path.exists():
+        with open(log_path, newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("description"):
+                    index.add(row["description"])
+    return index
 
 
 def log_battery_status(config):
@@ -1,13 +1,52 @@
+from typing import Optional
+
 from PIL.Image import Image
 from pydantic import BaseModel
 
-from piframe import models, prompts
+from piframe import models, preprocessing, prompts
+from piframe.hardware.display import DisplayBackend, RefreshMode
+from piframe.image_utils import DitherMode
 from piframe.reflection import ModuleDefinition
+from piframe.schedule import PowerBudget
+from piframe.weather import WeatherProvider
 
 
 class Config(BaseModel):
     artifact_directory: str
     schedule: str
+    # Skips scheduled wakes and steps down to cheaper tiers on battery. None
+    # follows the schedule as is.
+    power_budget: Optional[PowerBudget] = None
     description_model: ModuleDefinition[models.Model[str]]
     image_model: ModuleDefinition[models.Model[Image]]
+    # Images generated per wake. The one best suited to the panel is shown.
+    image_candidates: int = 1
+    # Images whose perceptual hash is within this many bits of an archived image's
+    # are rejected and regenerated up to duplicate_retries times. None disables it.
+    duplicate_hash_distance: Optional[int] = 6
+    duplicate_retries: int = 1
+    # Descriptions whose estimated shingle similarity to a past description is at
+    # least this are re-rolled with a fresh topic, up to description_retries times.
+    # None disables it.
+    description_similarity_threshold: Optional[float] = 0.5
+    description_retries: int = 2
     topic_strategy: ModuleDefinition[prompts.TopicStrategy]
+    weather: ModuleDefinition[WeatherProvider] = ModuleDefinition(
+        class_path="piframe.weather.CachedForecast", args={}
+    )
+    # Defaults to the physical panel when its driver is installed
+    display: Optional[ModuleDefinition[DisplayBackend]] = None
+    # Drops the original image and intermediate buffers as soon as they are no
+    # longer needed, for boards short on memory
+    release_buffers: bool = False
+    # Stages whose peak RSS in MB goes over this are flagged in the run journal.
+    # Nothing is limited.
+    memory_warning_mb: Optional[int] = None
+    trace_memory: bool = False
+    # Seconds between battery power samples for the per-stage energy in the run
+    # journal. None disables sampling.
+    energy_sample_interval: Optional[float] = 1.0
+    # Applied in order to the display-sized image before quantization
+    preprocessing_stages: list[ModuleDefinition[preprocessing.Stage]] = []
+    dither: DitherMode = "diffusion"
+    refresh_mode: RefreshMode = "full"
@@ -0,0 +1,191 @@
+import os
+import re
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    64-bit difference hash: whether each pixel of a 9x8 grayscale thumbnail is
+    brighter than its right neighbour.
+    """
+    thumbnail = image.convert("L").resize((9, 8), Image.BOX)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def _load_rows(path: Path, dtype: str, width: int = 1) -> np.ndarray:
+    """
+    The complete rows of width values appended to path. A row cut short by a
+    crash mid-append is dropped from the file, so later rows stay aligned.
+    """
+    data = path.read_bytes()
+    row_size = np.dtype(dtype).itemsize * width
+    whole = len(data) - len(data) % row_size
+    if whole < len(data):
+        print(f"Dropping an incomplete row at the end of {path}.")
+        os.truncate(path, whole)
+    return np.frombuffer(data[:whole], dtype=dtype).reshape(-1, width)
+
+
+class HashIndex:
+    """
+    Multi-index hashing for Hamming distance lookups over 64-bit hashes.
+
+    Hashes are split into max_distance + 1 chunks, each with its own exact-match
+    table. Two hashes within max_distance bits of each other must agree exactly on
+    at least one chunk, so a query only compares against hashes sharing a chunk
+    with it rather than the whole index.
+
+    When a path is given, hashes are appended to it as raw uint64 and loaded again
+    on the next run.
+    """
+
+    def __init__(self, max_distance: int = 6, path: Optional[Path] = None):
+        self.max_distance = max_distance
+        self._path = path
+        chunks = max_distance + 1
+        widths = [HASH_BITS // chunks + (i < HASH_BITS % chunks) for i in range(chunks)]
+        offsets = np.cumsum([0] + widths[:-1])
+        self._chunks = [
+            (int(offset), (1 << width) - 1) for offset, width in zip(offsets, widths)
+        ]
+        self._tables = [defaultdict(list) for _ in self._chunks]
+        self._hashes: list[int] = []
+        if path is not None and path.exists():
+            for (value,) in _load_rows(path, "<u8"):
+                self._insert(int(value))
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _keys(self, value: int):
+        return [(value >> offset) & mask for offset, mask in self._chunks]
+
+    def _insert(self, value: int):
+        position = len(self._hashes)
+        self._hashes.append(value)
+        for table, key in zip(self._tables, self._keys(value)):
+            table[key].append(position)
+
+    def add(self, value: int):
+        self._insert(value)
+        if self._path is not None:
+            with open(self._path, "ab") as f:
+                f.write(value.to_bytes(8, "little"))
+
+    def nearest(self, value: int) -> Optional[tuple[int, int]]:
+        """The closest indexed hash within max_distance bits and its distance."""
+        best = None
+        seen = set()
+        for table, key in zip(self._tables, self._keys(value)):
+            for position in table.get(key, ()):
+                if position in seen:
+                    continue
+                seen.add(position)
+                distance = (self._hashes[position] ^ value).bit_count()
+                if distance <= self.max_distance and (
+                    best is None or distance < best[1]
+                ):
+                    best = (self._hashes[position], distance)
+        return best
+
+    def is_duplicate(self, value: int) -> bool:
+        return self.nearest(value) is not None
+
+
+def shingles(text: str, size: int = 5) -> np.ndarray:
+    """crc32 of every size-character window of the normalized text."""
+    normalized = " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+    windows = {normalized[i : i + size] for i in range(len(normalized) - size + 1)}
+    return np.array(
+        [zlib.crc32(window.encode()) for window in windows or {normalized}],
+        dtype=np.uint64,
+    )
+
+
+class DescriptionIndex:
+    """
+    MinHash signatures of past descriptions in an LSH table.
+
+    Signatures are split into bands of rows each and every band is an exact-match
+    bucket, so a query only compares against descriptions sharing a band, about
+    those with Jaccard similarity above (1 / bands) ** (1 / rows). Similarity of
+    those candidates is estimated from the fraction of equal signature values.
+
+    When a path is given, signatures are appended to it and the most recent ones
+    are loaded again on the next run.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        bands: int = 16,
+        rows: int = 4,
+        path: Optional[Path] = None,
+        recent: Optional[int] = 1000,
+        seed: int = 1,
+    ):
+        self.threshold = threshold
+        self._bands = bands
+        self._rows = rows
+        self._path = path
+        permutations = bands * rows
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing, one odd multiplier per permutation
+        self._a = rng.integers(1, 2**63, permutations, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, permutations, dtype=np.uint64)
+        self._tables = [defaultdict(list) for _ in range(bands)]
+        self._signatures: list[np.ndarray] = []
+        if path is not None and path.exists():
+            stored = _load_rows(path, "<u4", permutations)
+            for signature in stored[-recent:] if recent else stored:
+                self._insert(signature)
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text)
+        mixed = (hashes[:, np.newaxis] * self._a + self._b) >> np.uint64(32)
+        return mixed.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [band.tobytes() for band in signature.reshape(self._bands, self._rows)]
+
+    def _insert(self, signature: np.ndarray):
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        for table, key in zip(self._tables, self._band_keys(signature)):
+            table[key].append(position)
+
+    def add(self, text: str):
+        signature = self.signature(text)
+        self._insert(signature)
+        if self._path is not None:
+            with open(self._path, "ab") as f:
+                f.write(signature.astype("<u4").tobytes())
+
+    def most_similar(self, text: str) -> Optional[float]:
+        """
+        Estimated Jaccard similarity to the closest indexed description, if any is
+        at or above the threshold.
+        """
+        signature = self.signature(text)
+        candidates = set()
+        for table, key in zip(self._tables, self._band_keys(signature)):
+            candidates.update(table.get(key, ()))
+        similarities = [
+            float((self._signatures[position] == signature).mean())
+            for position in candidates
+        ]
+        best = max(similarities, default=0.0)
+        return best if best >= self.threshold else None
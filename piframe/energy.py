@@ -0,0 +1,88 @@
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from piframe.journal import RunJournal
+
+
+class EnergySampler:
+    """
+    Samples battery power on a background thread and integrates it over the
+    stages of a run journal.
+
+    read returns the power drawn from the battery in watts, negative while
+    charging, or None when it could not be read. Power is treated as linear
+    between samples.
+    """
+
+    def __init__(self, read: Callable[[], Optional[float]], interval: float = 1.0):
+        self._read = read
+        self._interval = interval
+        self._times: list[float] = []
+        self._watts: list[float] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            sampled_at = time.time()
+            try:
+                watts = self._read()
+            except Exception:
+                watts = None
+            if watts is not None:
+                self._times.append(sampled_at)
+                self._watts.append(watts)
+            self._stop.wait(self._interval)
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="energy", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.time()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    def energy_j(self, start: float, end: float) -> Optional[float]:
+        """Joules between two time.time() timestamps."""
+        if not self._times or end <= start:
+            return None
+        times = np.asarray(self._times)
+        watts = np.asarray(self._watts)
+        inside = (times > start) & (times < end)
+        # Power at the edges is interpolated, or held from the nearest sample
+        grid = np.concatenate([[start], times[inside], [end]])
+        power = np.interp(grid, times, watts)
+        return float(np.sum((power[1:] + power[:-1]) / 2 * np.diff(grid)))
+
+    def annotate(self, journal: RunJournal):
+        """Add each stage's energy, and that of the whole sampled run, to the journal."""
+        for stage in journal.stages:
+            stage["energy_j"] = _round(
+                self.energy_j(stage["started_at"], stage["ended_at"])
+            )
+        journal.record(
+            energy_j=_round(
+                self.energy_j(self.started_at, self.stopped_at or time.time())
+            ),
+            energy_samples=len(self._times),
+        )
+
+
+def _round(energy: Optional[float]) -> Optional[float]:
+    return None if energy is None else round(energy, 4)
@@ -0,0 +1,298 @@
+"""
+A local daemon that owns the PiJuice I2C bus and the display SPI bus.
+
+update-frame and the configurator backend otherwise each open the buses
+themselves, with separate error backoff state, and can interleave
+transactions. With the broker running, both go through its Unix socket
+instead: requests are serialized per bus, recent register reads are served
+from a short-lived cache and batches of reads share one round trip.
+
+The protocol is one JSON object per line in each direction.
+
+    piframe-broker --socket /run/piframe/hardware.sock
+"""
+
+import base64
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Optional
+
+from piframe.hardware.display import DisplayBackend
+from piframe.hardware.pijuice import PiJuiceInterface
+
+SOCKET_PATH = os.environ.get("PIFRAME_BROKER_SOCKET", "/run/piframe/hardware.sock")
+DISPLAY_PHASES = ("init", "transfer", "refresh", "sleep")
+
+
+def broker_running(socket_path: str = SOCKET_PATH, timeout: float = 1.0) -> bool:
+    """
+    Whether a broker accepts connections on the socket. A socket file left behind
+    by a broker that died refuses them.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+class HardwareBroker:
+    """
+    Serializes access to the buses and caches register reads for cache_ttl
+    seconds, unless a read asks to be fresh. Writes drop the cached reads of the
+    register they touch.
+
+    The display is held by one connection from its init phase to its sleep
+    phase, or until that connection closes, so refreshes never interleave.
+    """
+
+    def __init__(
+        self,
+        interface: Optional[PiJuiceInterface],
+        display: Optional[DisplayBackend],
+        cache_ttl: float = 1.0,
+    ):
+        self._interface = interface
+        self._display = display
+        self._cache_ttl = cache_ttl
+        self._cache: dict[tuple[int, int], tuple[float, dict]] = {}
+        self._i2c_lock = threading.Lock()
+        self._display_lock = threading.Lock()
+
+    def _read(self, cmd: int, length: int, fresh: bool = False) -> dict:
+        key = (cmd, length)
+        cached = self._cache.get(key)
+        if not fresh and cached and time.monotonic() - cached[0] < self._cache_ttl:
+            return cached[1]
+        result = self._interface.ReadData(cmd, length)
+        if result["error"] == "NO_ERROR":
+            self._cache[key] = (time.monotonic(), result)
+        return result
+
+    def _write(self, cmd: int, data: list[int]) -> dict:
+        for key in [key for key in self._cache if key[0] == cmd]:
+            del self._cache[key]
+        return self._interface.WriteData(cmd, data)
+
+    def _i2c(self, request: dict) -> dict:
+        if request["op"] == "read":
+            return self._read(
+                request["cmd"], request["length"], request.get("fresh", False)
+            )
+        if request["op"] == "write":
+            return self._write(request["cmd"], request["data"])
+        return {"error": "BAD_ARGUMENT"}
+
+    def _display_phase(self, request: dict, connection: dict) -> dict:
+        phase = request.get("phase")
+        if self._display is None or phase not in DISPLAY_PHASES:
+            return {"error": "BAD_ARGUMENT"}
+        if phase == "init" and not connection.get("display"):
+            self._display_lock.acquire()
+            connection["display"] = True
+        elif not connection.get("display"):
+            return {"error": "DISPLAY_NOT_INITIALIZED"}
+        try:
+            if phase == "transfer":
+                self._display.transfer(base64.b64decode(request["data"]))
+            else:
+                getattr(self._display, phase)()
+        finally:
+            if phase == "sleep":
+                self.release_display(connection)
+        return {"error": "NO_ERROR"}
+
+    def release_display(self, connection: dict):
+        if connection.pop("display", False):
+            self._display_lock.release()
+
+    def handle(self, request: dict, connection: dict) -> dict:
+        op = request.get("op")
+        if op == "display":
+            return self._display_phase(request, connection)
+        if self._interface is None:
+            return {"error": "COMMUNICATION_ERROR"}
+        with self._i2c_lock:
+            if op == "batch":
+                return {
+                    "results": [self._i2c(item) for item in request["requests"]],
+                    "error": "NO_ERROR",
+                }
+            return self._i2c(request)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        broker: HardwareBroker = self.server.broker
+        connection = {}
+        try:
+            for line in self.rfile:
+                try:
+                    response = broker.handle(json.loads(line), connection)
+                except Exception as e:
+                    response = {"error": "BROKER_ERROR", "detail": repr(e)}
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+        finally:
+            broker.release_display(connection)
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(broker: HardwareBroker, socket_path: str = SOCKET_PATH):
+    path = Path(socket_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    with _Server(str(path), _Handler) as server:
+        os.chmod(path, 0o660)
+        server.broker = broker
+        print(f"Hardware broker listening on {path}")
+        server.serve_forever()
+
+
+class BrokerClient:
+    """A connection to the broker, reopened after errors. Safe to share."""
+
+    def __init__(self, socket_path: str = SOCKET_PATH, timeout: Optional[float] = 30.0):
+        self._socket_path = socket_path
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self._timeout)
+        sock.connect(self._socket_path)
+        self._file = sock.makefile("rwb")
+        sock.close()
+
+    def request(self, request: dict) -> dict:
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._connect()
+                self._file.write(json.dumps(request).encode() + b"\n")
+                self._file.flush()
+                line = self._file.readline()
+                if not line:
+                    raise ConnectionError("Broker closed the connection")
+                return json.loads(line)
+            except (OSError, ValueError):
+                self.close()
+                return {"error": "COMMUNICATION_ERROR"}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BrokerInterface:
+    """
+    Drop-in for PiJuiceInterface that goes through the broker. With fresh set,
+    reads skip the broker's cache.
+    """
+
+    def __init__(
+        self, socket_path: str = SOCKET_PATH, address: int = 0x14, fresh: bool = False
+    ):
+        self._client = BrokerClient(socket_path)
+        self.addr = address
+        self._fresh = fresh
+
+    def GetAddress(self):
+        return self.addr
+
+    def _read_request(self, cmd, length) -> dict:
+        return {"op": "read", "cmd": cmd, "length": length, "fresh": self._fresh}
+
+    def ReadData(self, cmd, length):
+        return self._client.request(self._read_request(cmd, length))
+
+    def ReadMany(self, registers):
+        requests = [self._read_request(cmd, length) for cmd, length in registers]
+        result = self._client.request({"op": "batch", "requests": requests})
+        if result["error"] != "NO_ERROR":
+            return [result] * len(registers)
+        return result["results"]
+
+    def WriteData(self, cmd, data):
+        return self._client.request({"op": "write", "cmd": cmd, "data": list(data)})
+
+    WriteDataVerify = PiJuiceInterface.WriteDataVerify
+
+
+class BrokerDisplay(DisplayBackend):
+    """Drives the broker's display, one phase per request."""
+
+    # The broker drives the same panel as Epd7in3e, so both share the digest of
+    # the framebuffer it shows
+    name = "epd7in3e"
+
+    def __init__(self, socket_path: str = SOCKET_PATH):
+        self._socket_path = socket_path
+        self._client: Optional[BrokerClient] = None
+
+    def _phase(self, phase: str, **args):
+        result = self._client.request({"op": "display", "phase": phase, **args})
+        if result["error"] != "NO_ERROR":
+            raise IOError(f"Display {phase} failed: {result}")
+
+    def init(self):
+        # A connection of its own, so the broker can release the display if this
+        # process dies mid-refresh. Refreshes take a while, so no timeout.
+        self._client = BrokerClient(self._socket_path, timeout=None)
+        self._phase("init")
+
+    def transfer(self, framebuffer: bytes):
+        self._phase("transfer", data=base64.b64encode(framebuffer).decode())
+
+    def refresh(self):
+        self._phase("refresh")
+
+    def sleep(self):
+        try:
+            self._phase("sleep")
+        finally:
+            self._client.close()
+
+
+def main():
+    from piframe.hardware import display
+    from piframe.hardware.pijuice_sim import SimulatedPiJuice
+    from piframe.hardware.virtual_display import VirtualDisplay
+
+    parser = ArgumentParser()
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--cache-ttl", type=float, default=1.0)
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Serve a simulated PiJuice and a virtual display",
+    )
+    args = parser.parse_args()
+
+    if args.simulate:
+        interface = PiJuiceInterface(i2cbus=SimulatedPiJuice())
+        display_backend = VirtualDisplay()
+    else:
+        try:
+            interface = PiJuiceInterface()
+        except IOError as e:
+            print(f"PiJuice unavailable: {e!r}")
+            interface = None
+        display_backend = display.Epd7in3e() if display.display_available else None
+    serve(HardwareBroker(interface, display_backend, args.cache_ttl), args.socket)
+
+
+if __name__ == "__main__":
+    main()
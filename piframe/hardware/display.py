@@ -1,20 +1,325 @@
+import hashlib
+import importlib.util
 import time
+from abc import ABC, abstractmethod
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Literal, Optional
 
-from PIL.Image import Image
+import numpy as np
+from PIL.Image import Image, Transpose
 
-try:
-    from waveshare_epd import epd7in3e
+from piframe import image_utils
+from piframe.image_utils import DitherMode
 
-    display_available = True
-except:
-    display_available = False
+# The driver claims the panel's GPIO pins when imported, so it is only imported
+# once a refresh starts rather than by everything that imports this module
+display_available = importlib.util.find_spec("waveshare_epd") is not None
 
+WIDTH = 800
+HEIGHT = 480
 
-def render(image: Image):
-    if display_available:
-        epd = epd7in3e.EPD()
-        epd.init()
-        epd.Clear()
-        epd.display(epd.getbuffer(image))
-        time.sleep(3)
-        epd.sleep()
+# Colors the 7.3" Spectra 6 panel can show, and the 4-bit code the controller
+# expects for each. Code 0x4 is unused on this panel.
+PALETTE = np.array(
+    [
+        [0, 0, 0],
+        [255, 255, 255],
+        [255, 255, 0],
+        [255, 0, 0],
+        [0, 0, 255],
+        [0, 255, 0],
+    ],
+    dtype=np.uint8,
+)
+PALETTE_CODES = np.array([0x0, 0x1, 0x2, 0x3, 0x5, 0x6], dtype=np.uint8)
+
+FRAMEBUFFER_SIZE = WIDTH * HEIGHT // 2
+FRAMEBUFFER_SUFFIX = ".fb"
+
+# full clears the panel to white before drawing, which costs a second refresh.
+# direct draws over whatever is showing.
+RefreshMode = Literal["full", "direct"]
+
+CACHE_DIRECTORY = Path.home() / ".cache" / "piframe"
+LUT_LEVELS = 64
+LUT_PATH = (
+    CACHE_DIRECTORY
+    / f"spectra6-{hashlib.sha1(PALETTE.tobytes()).hexdigest()[:8]}-{LUT_LEVELS}.npy"
+)
+# Byte that sets both pixels to white, used to clear the panel
+CLEAR_BYTE = 0x11
+
+
+@lru_cache(maxsize=None)
+def palette_lut() -> np.ndarray:
+    return image_utils.load_palette_lut(LUT_PATH, PALETTE, LUT_LEVELS)
+
+
+def pack_framebuffer(codes: np.ndarray) -> np.ndarray:
+    """Pack a (HEIGHT, WIDTH) array of 4-bit color codes two pixels per byte."""
+    return ((codes[:, 0::2] << 4) | codes[:, 1::2]).ravel()
+
+
+def unpack_framebuffer(framebuffer: np.ndarray) -> np.ndarray:
+    """Inverse of pack_framebuffer."""
+    packed = np.asarray(framebuffer, dtype=np.uint8).reshape(HEIGHT, WIDTH // 2)
+    codes = np.empty((HEIGHT, WIDTH), dtype=np.uint8)
+    codes[:, 0::2] = packed >> 4
+    codes[:, 1::2] = packed & 0x0F
+    return codes
+
+
+def get_framebuffer(image: Image, dither: DitherMode = "diffusion") -> np.ndarray:
+    """Quantize an image to the panel palette and pack it for the controller."""
+    if image.size == (HEIGHT, WIDTH):
+        image = image.transpose(Transpose.ROTATE_90)
+    # Diffusion matches colors itself, so only the other modes need the table
+    lut = palette_lut() if dither != "diffusion" else None
+    indices = image_utils.quantize(image, PALETTE, dither, lut=lut)
+    return pack_framebuffer(PALETTE_CODES[indices])
+
+
+def framebuffer_path(image_path: Path) -> Path:
+    """Where the framebuffer for an archived image is stored."""
+    return image_path.with_suffix(FRAMEBUFFER_SUFFIX)
+
+
+def save_framebuffer(framebuffer: np.ndarray, path: Path):
+    framebuffer.tofile(path)
+
+
+def load_framebuffer(path: Path) -> np.ndarray:
+    return np.memmap(path, dtype=np.uint8, mode="r", shape=(FRAMEBUFFER_SIZE,))
+
+
+def framebuffer_digest(framebuffer: np.ndarray) -> str:
+    return hashlib.blake2b(framebuffer, digest_size=16).hexdigest()
+
+
+class DisplayBackend(ABC):
+    """
+    The steps of a panel refresh. DisplaySession sequences and times them.
+    """
+
+    # Distinguishes the state kept for each backend, such as the last framebuffer
+    name: str
+
+    def now(self) -> float:
+        """Clock used to time each phase."""
+        return time.perf_counter()
+
+    @abstractmethod
+    def init(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def transfer(self, framebuffer: bytes):
+        raise NotImplementedError
+
+    @abstractmethod
+    def refresh(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def sleep(self):
+        raise NotImplementedError
+
+
+class Epd7in3e(DisplayBackend):
+    """
+    The Waveshare 7.3" Spectra 6 panel.
+
+    The refresh sequence is driven directly rather than through epd.display, so
+    BUSY is polled with a timeout and the panel is put to sleep as soon as it
+    reports idle, with no fixed delays.
+    """
+
+    name = "epd7in3e"
+
+    def __init__(self, busy_timeout: float = 60.0, poll_interval: float = 0.01):
+        self._busy_timeout = busy_timeout
+        self._poll_interval = poll_interval
+        self._epd = None
+        self._epdconfig = None
+
+    def init(self):
+        from waveshare_epd import epd7in3e, epdconfig
+
+        self._epdconfig = epdconfig
+        self._epd = epd7in3e.EPD()
+        self._epd.init()
+
+    def _wait_until_idle(self):
+        # BUSY is held low while the controller is working
+        deadline = time.monotonic() + self._busy_timeout
+        while self._epdconfig.digital_read(self._epd.busy_pin) == 0:
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Display still busy after {self._busy_timeout} seconds"
+                )
+            time.sleep(self._poll_interval)
+
+    def transfer(self, framebuffer: bytes):
+        self._epd.send_command(0x10)  # DATA_START_TRANSMISSION
+        self._epd.send_data2(framebuffer)
+
+    def refresh(self):
+        self._epd.send_command(0x04)  # POWER_ON
+        self._wait_until_idle()
+        # Booster soft start second setting, as sent by the vendor TurnOnDisplay
+        self._epd.send_command(0x06)
+        for value in (0x6F, 0x1F, 0x17, 0x49):
+            self._epd.send_data(value)
+        self._epd.send_command(0x12)  # DISPLAY_REFRESH
+        self._epd.send_data(0x00)
+        self._wait_until_idle()
+        self._epd.send_command(0x02)  # POWER_OFF
+        self._epd.send_data(0x00)
+        self._wait_until_idle()
+
+    def sleep(self):
+        self._epd.send_command(0x07)  # DEEP_SLEEP
+        self._epd.send_data(0xA5)
+        self._epdconfig.module_exit()
+
+
+def default_backend() -> Optional[DisplayBackend]:
+    """The hardware broker's display when it is running, else the panel."""
+    from piframe.hardware import broker
+
+    if broker.broker_running():
+        return broker.BrokerDisplay()
+    return Epd7in3e() if display_available else None
+
+
+class DisplaySession:
+    """A powered-up session with a display that records how long each phase takes."""
+
+    def __init__(self, backend: DisplayBackend):
+        self.backend = backend
+        self.timings: dict[str, float] = {}
+
+    def __enter__(self):
+        with self._phase("init"):
+            self.backend.init()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._phase("sleep"):
+            self.backend.sleep()
+        return False
+
+    @contextmanager
+    def _phase(self, name: str):
+        start = self.backend.now()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(
+                self.timings.get(name, 0.0) + self.backend.now() - start, 3
+            )
+
+    def clear(self):
+        with self._phase("clear"):
+            self.backend.transfer(bytes([CLEAR_BYTE]) * FRAMEBUFFER_SIZE)
+            self.backend.refresh()
+
+    def display(self, framebuffer: np.ndarray):
+        with self._phase("transfer"):
+            self.backend.transfer(framebuffer.tobytes())
+        with self._phase("refresh"):
+            self.backend.refresh()
+
+
+def _last_framebuffer_path(backend: DisplayBackend) -> Path:
+    """Holds the digest of the framebuffer a backend is currently showing."""
+    return CACHE_DIRECTORY / f"last_framebuffer.{backend.name}.digest"
+
+
+def _last_framebuffer_digest(backend: DisplayBackend) -> Optional[str]:
+    try:
+        return _last_framebuffer_path(backend).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _set_last_framebuffer_digest(backend: DisplayBackend, digest: str):
+    path = _last_framebuffer_path(backend)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(digest)
+
+
+def render_framebuffer(
+    framebuffer: np.ndarray,
+    mode: RefreshMode = "full",
+    force: bool = False,
+    backend: Optional[DisplayBackend] = None,
+) -> Optional[dict[str, float]]:
+    """
+    Push a framebuffer to a display, the physical panel by default.
+
+    The refresh is skipped entirely when the display already shows the same
+    framebuffer, unless force is set. Returns the seconds spent in each display
+    phase, or None when the display was not refreshed.
+    """
+    backend = backend or default_backend()
+    if backend is None:
+        return None
+
+    digest = framebuffer_digest(framebuffer)
+    if not force and digest == _last_framebuffer_digest(backend):
+        print("Framebuffer unchanged, skipping refresh.")
+        return None
+
+    with DisplaySession(backend) as session:
+        if mode == "full":
+            session.clear()
+        session.display(framebuffer)
+    _set_last_framebuffer_digest(backend, digest)
+    return session.timings
+
+
+def render(
+    image: Image,
+    dither: DitherMode = "diffusion",
+    mode: RefreshMode = "full",
+    backend: Optional[DisplayBackend] = None,
+) -> Optional[dict[str, float]]:
+    backend = backend or default_backend()
+    if backend is None:
+        return None
+    return render_framebuffer(get_framebuffer(image, dither), mode, backend=backend)
+
+
+def render_archived(
+    image_path: Path,
+    mode: RefreshMode = "full",
+    backend: Optional[DisplayBackend] = None,
+) -> Optional[dict[str, float]]:
+    """Show an archived image again straight from its stored framebuffer."""
+    framebuffer = load_framebuffer(framebuffer_path(image_path))
+    return render_framebuffer(framebuffer, mode, backend=backend)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--build-lut",
+        action="store_true",
+        help="Precompute the RGB to palette lookup table used by render",
+    )
+    parser.add_argument(
+        "--render-archived",
+        type=Path,
+        help="Show an archived image again from the framebuffer stored next to it",
+    )
+    args = parser.parse_args()
+    if args.render_archived:
+        render_archived(args.render_archived)
+    if args.build_lut:
+        LUT_PATH.unlink(missing_ok=True)
+        palette_lut()
+        print(f"Wrote {LUT_PATH}")
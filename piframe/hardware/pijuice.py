@@ -1,11 +1,20 @@
 __version__ = "1.8"
 
 import ctypes
+import fcntl
+import os
 import sys
 import threading
 import time
+from dataclasses import dataclass
+from typing import Optional
 
-from smbus import SMBus
+from piframe.hardware.pijuice_registers import REGISTERS
+
+try:
+    from smbus import SMBus
+except ImportError:
+    SMBus = None
 
 pijuice_hard_functions = [
     "HARD_FUNC_POWER_ON",
@@ -22,17 +31,28 @@ pijuice_user_functions = ["USER_EVENT"] + [
     "USER_FUNC" + str(i + 1) for i in range(0, 15)
 ]
 
+# ioctl from linux/i2c-dev.h, takes the bus timeout in units of 10 ms
+I2C_TIMEOUT = 0x0702
+
 
 class PiJuiceInterface(object):
-    def __init__(self, bus=1, address=0x14):
+    def __init__(self, bus=1, address=0x14, timeout=0.1, i2cbus=None):
         """Create a new PiJuice instance.  Bus is an optional parameter that
         specifies the I2C bus number to use, for example 1 would use device
         /dev/i2c-1.  If bus is not specified then the open function should be
-        called to open the bus.
+        called to open the bus. Transfers give up after timeout seconds.
+        i2cbus replaces the SMBus with any object offering its block transfer
+        methods, such as pijuice_sim.SimulatedPiJuice.
         """
-        self.i2cbus = SMBus(bus)
+        if i2cbus is None:
+            if SMBus is None:
+                raise IOError("smbus is not installed")
+            i2cbus = SMBus(bus)
+            self._SetBusTimeout(bus, timeout)
+        self.i2cbus = i2cbus
         self.addr = address
-        self.t = None
+        # Transfers pass their arguments and results through attributes
+        self.lock = threading.RLock()
         self.comError = False
         self.errTime = 0
 
@@ -77,34 +97,38 @@ class PiJuiceInterface(object):
             self.comError = True
             self.errTime = time.time()
 
-    def _DoTransfer(self, oper):
-        if (self.t != None and self.t.is_alive()) or (
-            self.comError and (time.time() - self.errTime) < 4
-        ):
-            return False
-
-        self.t = threading.Thread(target=oper, args=())
-        self.t.start()
+    def _SetBusTimeout(self, bus, timeout):
+        # The kernel enforces the timeout, so transfers can run inline instead of
+        # on a watchdog thread. The timeout belongs to the adapter, so setting it
+        # through a descriptor of our own covers the SMBus's transfers too.
+        try:
+            fd = os.open(f"/dev/i2c-{bus}", os.O_RDWR)
+        except OSError:
+            return
+        try:
+            fcntl.ioctl(fd, I2C_TIMEOUT, max(1, round(timeout * 100)))
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
 
-        # wait for transfer to finish or timeout
-        n = 0
-        while self.t.is_alive() and n < 2:
-            time.sleep(0.05)
-            n = n + 1
-        if self.comError or self.t.is_alive():
+    def _DoTransfer(self, oper):
+        if self.comError and (time.time() - self.errTime) < 4:
             return False
 
-        return True
+        oper()
+        return not self.comError
 
     def ReadData(self, cmd, length):
         d = []
 
-        self.cmd = cmd
-        self.length = length + 1
-        if not self._DoTransfer(self._Read):
-            return {"error": "COMMUNICATION_ERROR"}
+        with self.lock:
+            self.cmd = cmd
+            self.length = length + 1
+            if not self._DoTransfer(self._Read):
+                return {"error": "COMMUNICATION_ERROR"}
+            d = self.d
 
-        d = self.d
         if self._GetChecksum(d[0:-1]) != d[-1]:
             # With n+1 byte data (n data bytes and 1 checksum byte) sometimes the
             # MSbit of the first received data byte is 0 while it should be 1. So we
@@ -117,15 +141,21 @@ class PiJuiceInterface(object):
         del d[-1]
         return {"data": d, "error": "NO_ERROR"}
 
+    def ReadMany(self, registers):
+        """ReadData for each (cmd, length), without other transfers in between."""
+        with self.lock:
+            return [self.ReadData(cmd, length) for cmd, length in registers]
+
     def WriteData(self, cmd, data):
         fcs = self._GetChecksum(data)
         d = data[:]
         d.append(fcs)
 
-        self.cmd = cmd
-        self.d = d
-        if not self._DoTransfer(self._Write):
-            return {"error": "COMMUNICATION_ERROR"}
+        with self.lock:
+            self.cmd = cmd
+            self.d = d
+            if not self._DoTransfer(self._Write):
+                return {"error": "COMMUNICATION_ERROR"}
 
         return {"error": "NO_ERROR"}
 
@@ -149,6 +179,78 @@ class PiJuiceInterface(object):
                     return {"error": "WRITE_FAILED"}
 
 
+batStatusEnum = ["NORMAL", "CHARGING_FROM_IN", "CHARGING_FROM_5V_IO", "NOT_PRESENT"]
+powerInStatusEnum = ["NOT_PRESENT", "BAD", "WEAK", "PRESENT"]
+batChargingTempEnum = ["NORMAL", "SUSPEND", "COOL", "WARM"]
+faultFlagBits = [
+    (0x01, "button_power_off"),
+    (0x02, "forced_power_off"),
+    (0x04, "forced_sys_power_off"),
+    (0x08, "watchdog_reset"),
+    (0x20, "battery_profile_invalid"),
+]
+
+# Every possible status and fault register byte, decoded once
+STATUS_TABLE = [
+    (
+        bool(d & 0x01),
+        bool(d & 0x02),
+        batStatusEnum[(d >> 2) & 0x03],
+        powerInStatusEnum[(d >> 4) & 0x03],
+        powerInStatusEnum[(d >> 6) & 0x03],
+    )
+    for d in range(256)
+]
+FAULT_TABLE = [
+    (
+        tuple(name for bit, name in faultFlagBits if d & bit),
+        batChargingTempEnum[(d >> 6) & 0x03],
+    )
+    for d in range(256)
+]
+# Stand-ins for a status or fault register that could not be read
+UNKNOWN_STATUS = (None,) * 5
+UNKNOWN_FAULT = ((), None)
+
+
+@dataclass(frozen=True)
+class PowerSnapshot:
+    """
+    The PiJuice status registers, read together. Fields of registers that
+    could not be read are None, and errors holds (register, error) pairs.
+    """
+
+    is_fault: Optional[bool]
+    is_button: Optional[bool]
+    battery: Optional[str]
+    power_input: Optional[str]
+    power_input_5v_io: Optional[str]
+    charge_level: Optional[int]
+    # Names of the set fault flags
+    faults: tuple
+    charging_temperature: Optional[str]
+    temperature_c: Optional[int]
+    voltage_mv: Optional[int]
+    current_ma: Optional[int]
+    io_voltage_mv: Optional[int]
+    io_current_ma: Optional[int]
+    errors: tuple = ()
+
+    @property
+    def is_battery_powered(self):
+        return (
+            self.power_input == "NOT_PRESENT"
+            and self.power_input_5v_io == "NOT_PRESENT"
+        )
+
+    def fault_status(self):
+        """Faults in the form GetFaultStatus returns them."""
+        fault = dict.fromkeys(self.faults, True)
+        if self.charging_temperature not in ("NORMAL", None):
+            fault["charging_temperature_fault"] = self.charging_temperature
+        return fault
+
+
 class PiJuiceStatus(object):
     STATUS_CMD = 0x40
     FAULT_EVENT_CMD = 0x44
@@ -194,6 +296,62 @@ class PiJuiceStatus(object):
             status["powerInput5vIo"] = powerInStatusEnum[(d >> 6) & 0x03]
             return {"data": status, "error": "NO_ERROR"}
 
+    # The firmware answers each command separately, with its own checksum, so
+    # there is one read per register
+    SNAPSHOT_REGISTERS = [
+        REGISTERS[name]
+        for name in [
+            "STATUS",
+            "CHARGE_LEVEL",
+            "FAULT_EVENT",
+            "BATTERY_TEMPERATURE",
+            "BATTERY_VOLTAGE",
+            "BATTERY_CURRENT",
+            "IO_VOLTAGE",
+            "IO_CURRENT",
+        ]
+    ]
+
+    def GetSnapshot(self, attempts=2):
+        """
+        A register whose read fails is read again on its own, up to attempts
+        reads in all. If it still fails, only its fields are missing from the
+        snapshot. It is an error only when no register could be read.
+        """
+        results = self.interface.ReadMany(
+            [(register.cmd, register.length) for register in self.SNAPSHOT_REGISTERS]
+        )
+        values, errors = [], []
+        for register, result in zip(self.SNAPSHOT_REGISTERS, results):
+            for _ in range(attempts - 1):
+                if result["error"] == "NO_ERROR":
+                    break
+                result = self.interface.ReadData(register.cmd, register.length)
+            if result["error"] == "NO_ERROR":
+                values.extend(register.decode(result["data"]))
+            else:
+                values.append(None)
+                errors.append((register.name, result["error"]))
+        if len(errors) == len(self.SNAPSHOT_REGISTERS):
+            return {"error": errors[0][1]}
+        status, charge, fault, temp, volt, curr, io_volt, io_curr = values
+        faults, charging_temperature = (
+            UNKNOWN_FAULT if fault is None else FAULT_TABLE[fault]
+        )
+        snapshot = PowerSnapshot(
+            *(UNKNOWN_STATUS if status is None else STATUS_TABLE[status]),
+            charge_level=charge,
+            faults=faults,
+            charging_temperature=charging_temperature,
+            temperature_c=temp,
+            voltage_mv=volt,
+            current_ma=curr,
+            io_voltage_mv=io_volt,
+            io_current_ma=io_curr,
+            errors=tuple(errors),
+        )
+        return {"data": snapshot, "error": "NO_ERROR"}
+
     def GetChargeLevel(self):
         result = self.interface.ReadData(self.CHARGE_LEVEL_CMD, 1)
         if result["error"] != "NO_ERROR":
@@ -1792,8 +1950,10 @@ class PiJuiceConfig(object):
 
 # Create an interface object for accessing PiJuice features via I2C bus.
 class PiJuice(object):
-    def __init__(self, bus=1, address=0x14):
-        self.interface = PiJuiceInterface(bus, address)
+    def __init__(self, bus=1, address=0x14, i2cbus=None, interface=None):
+        if interface is None:
+            interface = PiJuiceInterface(bus, address, i2cbus=i2cbus)
+        self.interface = interface
         self.status = PiJuiceStatus(self.interface)
         self.config = PiJuiceConfig(self.interface)
         self.power = PiJuicePower(self.interface)
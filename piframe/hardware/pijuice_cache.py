@@ -0,0 +1,144 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+from piframe.hardware.pijuice import PiJuiceInterface
+from piframe.hardware.pijuice_registers import (
+    REGISTERS,
+    RESET_TO_DEFAULT_CMD,
+    STATIC_COMMANDS,
+)
+
+CACHE_PATH = Path("~/.cache/piframe/pijuice_static.json").expanduser()
+
+
+class CachedInterface:
+    """
+    Wraps a PiJuiceInterface, answering reads of static registers from a cache
+    on disk so routine wakes only read the volatile ones from the bus.
+
+    A write drops the cached value of the register it touches, and a reset to
+    defaults drops them all. The firmware version is read from the bus at most
+    every verify_interval seconds, and the whole cache is dropped when it has
+    changed. The file is read again whenever another process has changed it, and
+    each change is applied to the latest file under a lock.
+    """
+
+    def __init__(
+        self,
+        interface,
+        path: Path = CACHE_PATH,
+        verify_interval: float = 24 * 3600,
+    ):
+        self._interface = interface
+        self._path = path
+        self._verify_interval = verify_interval
+        self._lock = threading.RLock()
+        self._cache: Optional[dict] = None
+        self._mtime: Optional[int] = None
+
+    def __getattr__(self, name):
+        return getattr(self._interface, name)
+
+    def _read(self) -> dict:
+        """The cache on disk, read again whenever the file has changed."""
+        try:
+            mtime = self._path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._cache is None or mtime != self._mtime:
+            try:
+                with open(self._path) as f:
+                    cache = json.load(f)
+            except (FileNotFoundError, ValueError):
+                cache = {"firmware": None, "verified_at": 0, "registers": {}}
+            self._cache, self._mtime = cache, mtime
+        return self._cache
+
+    @contextmanager
+    def _file_lock(self):
+        # update-frame and the configurator backend share the cache file
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._path.with_suffix(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _update(self, change: Callable[[dict], None]):
+        """Applies change to the latest cache on disk and saves it."""
+        with self._file_lock():
+            cache = self._read()
+            change(cache)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self._path.parent, suffix=".partial", delete=False
+            ) as f:
+                json.dump(cache, f)
+            os.replace(f.name, self._path)
+            self._mtime = self._path.stat().st_mtime_ns
+
+    def _verified(self) -> Optional[dict]:
+        """The cache, or None when the firmware could not be checked."""
+        cache = self._read()
+        if time.time() - cache["verified_at"] <= self._verify_interval:
+            return cache
+        version = REGISTERS["FIRMWARE_VERSION"]
+        result = self._interface.ReadData(version.cmd, version.length)
+        if result["error"] != "NO_ERROR":
+            return None
+
+        def verify(cache):
+            if cache["firmware"] != result["data"]:
+                cache.update(firmware=result["data"], registers={})
+            cache["verified_at"] = time.time()
+
+        self._update(verify)
+        return self._cache
+
+    def ReadData(self, cmd, length):
+        if cmd not in STATIC_COMMANDS:
+            return self._interface.ReadData(cmd, length)
+        with self._lock:
+            cache = self._verified()
+            key = f"{cmd}:{length}"
+            if cache is not None and key in cache["registers"]:
+                return {"data": list(cache["registers"][key]), "error": "NO_ERROR"}
+            result = self._interface.ReadData(cmd, length)
+            if cache is not None and result["error"] == "NO_ERROR":
+                firmware = cache["firmware"]
+
+                def store(cache):
+                    # Unless the firmware changed while the bus was read
+                    if cache["firmware"] == firmware:
+                        cache["registers"][key] = list(result["data"])
+
+                self._update(store)
+            return result
+
+    def ReadMany(self, registers):
+        if any(cmd in STATIC_COMMANDS for cmd, _ in registers):
+            return [self.ReadData(cmd, length) for cmd, length in registers]
+        return self._interface.ReadMany(registers)
+
+    def WriteData(self, cmd, data):
+        if cmd not in STATIC_COMMANDS and cmd != RESET_TO_DEFAULT_CMD:
+            return self._interface.WriteData(cmd, data)
+
+        def invalidate(cache):
+            for key in list(cache["registers"]):
+                if cmd == RESET_TO_DEFAULT_CMD or key.startswith(f"{cmd}:"):
+                    del cache["registers"][key]
+
+        with self._lock:
+            # Dropped before the write so a failed write leaves nothing stale,
+            # and after it in case another process cached the old value meanwhile
+            self._update(invalidate)
+            result = self._interface.WriteData(cmd, data)
+            self._update(invalidate)
+        return result
+
+    WriteDataVerify = PiJuiceInterface.WriteDataVerify
@@ -0,0 +1,91 @@
+import struct
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Register:
+    """
+    A PiJuice command and the layout of its data bytes as a little-endian struct
+    format. Registers repeated per LED, button or IO pin have count instances,
+    stride commands apart.
+
+    Static registers hold configuration that only changes when written.
+    """
+
+    name: str
+    cmd: int
+    format: str
+    static: bool = False
+    count: int = 1
+    stride: int = 1
+
+    @property
+    def length(self) -> int:
+        return struct.calcsize(self.format)
+
+    @property
+    def commands(self) -> range:
+        return range(self.cmd, self.cmd + self.count * self.stride, self.stride)
+
+    def decode(self, data) -> tuple:
+        return struct.unpack(self.format, bytes(data))
+
+
+# Formats give each register's fields at their stored widths. Bit fields, BCD
+# clock bytes and scaled values stay as stored, and are interpreted by
+# PiJuiceConfig, PiJuiceRtcAlarm and GetSnapshot.
+REGISTERS = {
+    register.name: register
+    for register in [
+        Register("STATUS", 0x40, "<B"),
+        Register("CHARGE_LEVEL", 0x41, "<B"),
+        Register("FAULT_EVENT", 0x44, "<B"),
+        Register("BUTTON_EVENT", 0x45, "<2B"),
+        # Only the low byte carries the temperature
+        Register("BATTERY_TEMPERATURE", 0x47, "<bx"),
+        Register("BATTERY_VOLTAGE", 0x49, "<H"),
+        Register("BATTERY_CURRENT", 0x4B, "<h"),
+        Register("IO_VOLTAGE", 0x4D, "<H"),
+        Register("IO_CURRENT", 0x4F, "<h"),
+        Register("CHARGING_CONFIG", 0x51, "<B", static=True),
+        Register("BATTERY_PROFILE_ID", 0x52, "<B", static=True),
+        # Packed capacity, charge, termination, regulation and cutoff steps,
+        # cold, cool, warm and hot temperatures, NTC B and NTC resistance / 10
+        Register("BATTERY_PROFILE", 0x53, "<H4B4b2H", static=True),
+        # Chemistry, OCV at 10, 50 and 90% in mV, resistance there in mOhm / 10
+        Register("BATTERY_EXT_PROFILE", 0x54, "<B6H4x", static=True),
+        Register("BATTERY_TEMP_SENSE_CONFIG", 0x5D, "<B", static=True),
+        Register("POWER_INPUTS_CONFIG", 0x5E, "<B", static=True),
+        Register("RUN_PIN_CONFIG", 0x5F, "<B", static=True),
+        Register("POWER_REGULATOR_CONFIG", 0x60, "<B", static=True),
+        Register("WATCHDOG_ACTIVATION", 0x61, "<H"),
+        Register("POWER_OFF", 0x62, "<B"),
+        Register("WAKEUP_ON_CHARGE", 0x63, "<B"),
+        Register("SYSTEM_POWER_SWITCH_CTRL", 0x64, "<B"),
+        Register("LED_STATE", 0x66, "<3B", count=2),
+        Register("LED_BLINK", 0x68, "<9B", count=2),
+        Register("LED_CONFIGURATION", 0x6A, "<4B", static=True, count=2),
+        Register("BUTTON_CONFIGURATION", 0x6E, "<12B", static=True, count=3),
+        Register("IO_CONFIGURATION", 0x72, "<5B", static=True, count=2, stride=5),
+        Register("IO_PIN_ACCESS", 0x75, "<2B", count=2, stride=5),
+        Register("I2C_ADDRESS", 0x7C, "<B", static=True, count=2),
+        Register("ID_EEPROM_WRITE_PROTECT_CTRL", 0x7E, "<B", static=True),
+        Register("ID_EEPROM_ADDRESS", 0x7F, "<B", static=True),
+        # BCD second, minute, hour, weekday, day, month and year, then subsecond
+        # and daylight saving flags
+        Register("RTC_TIME", 0xB0, "<9B"),
+        # BCD second, minute and hour with disable flags, weekday or day, a
+        # 24 bit hour mask, minute period and a weekday mask
+        Register("RTC_ALARM", 0xB9, "<9B"),
+        Register("RTC_CTRL_STATUS", 0xC2, "<2B"),
+        Register("FIRMWARE_VERSION", 0xFD, "<2B", static=True),
+    ]
+}
+STATIC_COMMANDS = frozenset(
+    cmd
+    for register in REGISTERS.values()
+    if register.static
+    for cmd in register.commands
+)
+# Writing the reset command restores every register to its default
+RESET_TO_DEFAULT_CMD = 0xF0
@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from piframe.hardware.pijuice_registers import REGISTERS
+
+# Register lengths in data bytes, excluding the checksum
+REGISTER_LENGTHS = {
+    cmd: register.length for register in REGISTERS.values() for cmd in register.commands
+}
+POWER_INPUT_STATES = ["NOT_PRESENT", "BAD", "WEAK", "PRESENT"]
+BATTERY_STATES = ["NORMAL", "CHARGING_FROM_IN", "CHARGING_FROM_5V_IO", "NOT_PRESENT"]
+# Errno the i2c-dev driver raises when a device does not acknowledge
+EREMOTEIO = 121
+
+
+def _bcd(value: int) -> int:
+    return ((value // 10) << 4) | (value % 10)
+
+
+def _from_bcd(value: int) -> int:
+    return (value >> 4) * 10 + (value & 0x0F)
+
+
+def _checksum(data) -> int:
+    fcs = 0xFF
+    for x in data:
+        fcs ^= x
+    return fcs
+
+
+class SimulatedPiJuice:
+    """
+    A software PiJuice HAT behind the SMBus block transfer calls
+    PiJuiceInterface makes, for running the hardware code paths off-device.
+
+    Status registers are derived from the simulated battery and power inputs,
+    the RTC follows the host clock plus whatever offset SetTime wrote, and other
+    registers hold whatever was last written to them. Reads can be made to fail
+    like the real bus does: msb_error_rate clears the top bit of the first data
+    byte (the fault ReadData corrects for) and bus_error_rate raises the OSError
+    a missing acknowledge does.
+
+    It starts out plugged in, so code that shuts down on battery power does not.
+    """
+
+    def __init__(
+        self,
+        charge_level: int = 80,
+        battery_voltage_mv: int = 3900,
+        battery_current_ma: int = -250,
+        temperature_c: int = 25,
+        battery: str = "CHARGING_FROM_IN",
+        power_input: str = "PRESENT",
+        power_input_5v_io: str = "NOT_PRESENT",
+        firmware_version: tuple[int, int] = (1, 6),
+        msb_error_rate: float = 0.0,
+        bus_error_rate: float = 0.0,
+        latency: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.charge_level = charge_level
+        self.battery_voltage_mv = battery_voltage_mv
+        self.battery_current_ma = battery_current_ma
+        self.temperature_c = temperature_c
+        self.battery = battery
+        self.power_input = power_input
+        self.power_input_5v_io = power_input_5v_io
+        self.fault_events = 0
+        self.msb_error_rate = msb_error_rate
+        self.bus_error_rate = bus_error_rate
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.powered_off_at: Optional[float] = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._rtc_offset = timedelta()
+        major, minor = firmware_version
+        self._registers = {
+            0x51: [0x01],
+            # Predefined profile 0, valid, from the host
+            0x52: [0x00],
+            # 1000 mAh, 850 mA charge, 4.18 V regulation, 3 V cutoff, 1-60 C,
+            # NTC B 3380 and 10 kOhm
+            0x53: [0xE8, 0x03, 4, 0, 34, 150, 1, 10, 45, 60, 0x34, 0x0D, 0xE8, 0x03],
+            0x5E: [0x07],
+            0x61: [0x00, 0x00],
+            0x62: [0xFF],
+            0x63: [0x7F],
+            0x64: [0x00],
+            # Alarm disabled
+            0xB9: [0x00, 0x00, 0x00, 0x00, 0xFF, 0xFF, 0xFF, 0x00, 0xFF],
+            0xC2: [0x00, 0x00],
+            0xFD: [(major << 4) | minor, 0x00],
+        }
+
+    def _derived(self, cmd: int) -> Optional[list[int]]:
+        if cmd == 0x40:
+            return [
+                (bool(self.fault_events) << 0)
+                | (BATTERY_STATES.index(self.battery) << 2)
+                | (POWER_INPUT_STATES.index(self.power_input) << 4)
+                | (POWER_INPUT_STATES.index(self.power_input_5v_io) << 6)
+            ]
+        if cmd == 0x41:
+            return [self.charge_level]
+        if cmd == 0x44:
+            return [self.fault_events]
+        if cmd == 0x45:
+            return [0x00, 0x00]
+        if cmd == 0x47:
+            return list(self.temperature_c.to_bytes(2, "little", signed=True))
+        if cmd == 0x49:
+            return list(self.battery_voltage_mv.to_bytes(2, "little"))
+        if cmd == 0x4B:
+            return list(self.battery_current_ma.to_bytes(2, "little", signed=True))
+        if cmd == 0x4D:
+            return list((3300).to_bytes(2, "little"))
+        if cmd == 0x4F:
+            return list((40).to_bytes(2, "little", signed=True))
+        if cmd == 0xB0:
+            now = datetime.now() + self._rtc_offset
+            return [
+                _bcd(now.second),
+                _bcd(now.minute),
+                _bcd(now.hour),
+                now.isoweekday(),
+                _bcd(now.day),
+                _bcd(now.month),
+                _bcd(now.year - 2000),
+                0x00,
+                0x00,
+            ]
+        return None
+
+    def _transact(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._random.random() < self.bus_error_rate:
+            raise OSError(EREMOTEIO, "Remote I/O error")
+
+    def read_i2c_block_data(self, addr: int, cmd: int, length: int) -> list[int]:
+        with self._lock:
+            self._transact()
+            self.reads += 1
+            data = self._derived(cmd)
+            if data is None:
+                data = self._registers.get(cmd, [0x00] * REGISTER_LENGTHS.get(cmd, 1))
+            data = (list(data) + [0x00] * length)[: length - 1]
+            response = data + [_checksum(data)]
+            if response[0] & 0x80 and self._random.random() < self.msb_error_rate:
+                response[0] &= 0x7F
+            return response
+
+    def write_i2c_block_data(self, addr: int, cmd: int, data: list[int]):
+        with self._lock:
+            self._transact()
+            self.writes += 1
+            *payload, fcs = data
+            if _checksum(payload) != fcs:
+                # The firmware drops writes that fail their checksum
+                return
+            if cmd == 0xB0:
+                written = datetime(
+                    2000 + _from_bcd(payload[6]),
+                    _from_bcd(payload[5] & 0x1F),
+                    _from_bcd(payload[4] & 0x3F),
+                    _from_bcd(payload[2] & 0x3F),
+                    _from_bcd(payload[1] & 0x7F),
+                    _from_bcd(payload[0] & 0x7F),
+                )
+                self._rtc_offset = written - datetime.now().replace(microsecond=0)
+            elif cmd == 0x44:
+                # Writing clears the fault flags whose bits are written as 0
+                self.fault_events &= payload[0]
+            elif cmd == 0x62 and payload[0] != 0xFF:
+                self.powered_off_at = time.time() + payload[0]
+            if cmd not in REGISTER_LENGTHS or self._derived(cmd) is None:
+                self._registers[cmd] = payload
@@ -1,25 +1,111 @@
 import os
-from datetime import datetime
-
-from piframe.hardware.pijuice import PiJuice
-
-try:
-    PIJUICE = PiJuice()
-    assert PIJUICE.status.GetStatus().get("data")
-    pijuice_available = True
-except:
-    pijuice_available = False
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from piframe.hardware.pijuice import PiJuice, PiJuiceInterface, PowerSnapshot
+from piframe.hardware.pijuice_cache import CachedInterface
+from piframe.hardware.pijuice_sim import SimulatedPiJuice
+
+
+class PiJuiceHandle:
+    """
+    The PiJuice, probed on first use rather than at import.
+
+    A probe makes up to attempts tries, each on a fresh interface so a bus error
+    does not put the next one into the interface's error backoff. After a failed
+    probe, get returns None until retry_interval seconds have passed and then
+    probes again, so one bad read does not disable power management for the
+    rest of the process.
+
+    With fresh_reads set, reads through the hardware broker skip its cache.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        attempt_delay: float = 0.05,
+        retry_interval: float = 30.0,
+        fresh_reads: bool = False,
+    ):
+        self._fresh_reads = fresh_reads
+        self._attempts = attempts
+        self._attempt_delay = attempt_delay
+        self._retry_interval = retry_interval
+        self._pijuice: Optional[PiJuice] = None
+        self._next_probe = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> PiJuice:
+        # Imported here as the broker pulls in the display stack
+        from piframe.hardware import broker
+
+        # PIFRAME_SIMULATE_PIJUICE=1 runs against a software PiJuice instead of the bus
+        if os.environ.get("PIFRAME_SIMULATE_PIJUICE"):
+            return PiJuice(i2cbus=SimulatedPiJuice())
+        if broker.broker_running():
+            interface = broker.BrokerInterface(fresh=self._fresh_reads)
+        else:
+            interface = PiJuiceInterface()
+        return PiJuice(interface=CachedInterface(interface))
+
+    def _probe(self) -> Optional[PiJuice]:
+        for attempt in range(self._attempts):
+            if attempt:
+                time.sleep(self._attempt_delay)
+            try:
+                pijuice = self._connect()
+                if pijuice.status.GetStatus().get("data"):
+                    return pijuice
+            except Exception:
+                pass
+        return None
+
+    def get(self) -> Optional[PiJuice]:
+        if self._pijuice is not None:
+            return self._pijuice
+        with self._lock:
+            if self._pijuice is None and time.monotonic() >= self._next_probe:
+                self._pijuice = self._probe()
+                if self._pijuice is None:
+                    self._next_probe = time.monotonic() + self._retry_interval
+        return self._pijuice
+
+    @property
+    def available(self) -> bool:
+        return self.get() is not None
+
+
+PIJUICE = PiJuiceHandle()
+# A separate connection for frequent sampling, so its bus errors do not put the
+# one used for alarms and power off into its error backoff
+SAMPLING_PIJUICE = PiJuiceHandle(fresh_reads=True)
+# Spaced further apart than the 4 second backoff that follows a bus error
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_DELAY = 4.5
+
+
+def _write_with_retries(write: Callable[[], dict]) -> bool:
+    for attempt in range(WRITE_ATTEMPTS):
+        if attempt:
+            time.sleep(WRITE_RETRY_DELAY)
+        result = write()
+        if result["error"] == "NO_ERROR":
+            return True
+        print(f"PiJuice write failed: {result['error']}")
+    return False
 
 
 def get_power_status() -> dict:
-    return PIJUICE.status.GetStatus()["data"] if pijuice_available else {}
+    pijuice = PIJUICE.get()
+    return pijuice.status.GetStatus()["data"] if pijuice else {}
 
 
 def is_battery_powered() -> bool:
-    if not pijuice_available:
-        return False
-
     status = get_power_status()
+    if not status:
+        return False
     return (
         status["powerInput"] == "NOT_PRESENT"
         and status["powerInput5vIo"] == "NOT_PRESENT"
@@ -27,15 +113,15 @@ def is_battery_powered() -> bool:
 
 
 def get_battery_level() -> float:
-    if pijuice_available:
-        charge_level = PIJUICE.status.GetChargeLevel()["data"]
+    if pijuice := PIJUICE.get():
+        charge_level = pijuice.status.GetChargeLevel()["data"]
         return charge_level / 100
 
 
 def set_current_time():
-    if pijuice_available:
+    if pijuice := PIJUICE.get():
         now = datetime.now()
-        PIJUICE.rtcAlarm.SetTime(
+        pijuice.rtcAlarm.SetTime(
             {
                 "year": now.year,
                 "month": now.month,
@@ -47,50 +133,91 @@ def set_current_time():
         )
 
 
-def set_alarm(wakeup: datetime):
-    if pijuice_available:
-        PIJUICE.rtcAlarm.SetWakeupEnabled(True)
-        PIJUICE.rtcAlarm.SetAlarm({"hour": wakeup.hour, "minute": wakeup.minute})
+def set_alarm(wakeup: datetime, now: Optional[datetime] = None) -> bool:
+    """
+    Wake at the given time. The alarm repeats daily unless the wake is more than
+    a day away, when it is pinned to the day of the month so the frame does not
+    wake at the same time tomorrow instead.
+
+    Returns whether the alarm was set.
+    """
+    alarm = {"hour": wakeup.hour, "minute": wakeup.minute}
+    if wakeup - (now or datetime.now()) > timedelta(days=1):
+        alarm["day"] = wakeup.day
+    if pijuice := PIJUICE.get():
+        return _write_with_retries(
+            lambda: pijuice.rtcAlarm.SetWakeupEnabled(True)
+        ) and _write_with_retries(lambda: pijuice.rtcAlarm.SetAlarm(alarm))
+    return False
+
+
+def shutdown() -> bool:
+    """
+    Halt with the PiJuice set to cut power once the halt completes. The Pi is
+    left running if the power off could not be set, as a halted Pi that keeps
+    its power does not wake on the alarm.
+    """
+    if pijuice := PIJUICE.get():
+        if _write_with_retries(lambda: pijuice.power.SetPowerOff(30)):
+            os.system(f"sudo shutdown -h now")
+            return True
+    return False
 
 
-def shutdown():
-    if pijuice_available:
-        PIJUICE.power.SetPowerOff(30)
-        os.system(f"sudo shutdown -h now")
+def enable_display_power():
+    if pijuice := PIJUICE.get():
+        pijuice.power.SetSystemPowerSwitch(500)
 
 
-def enable_display_power():
-    if pijuice_available:
-        PIJUICE.power.SetSystemPowerSwitch(500)
+def get_power_snapshot() -> Optional[PowerSnapshot]:
+    if pijuice := PIJUICE.get():
+        return pijuice.status.GetSnapshot().get("data")
+
+
+def get_battery_power() -> Optional[float]:
+    """
+    Watts drawn from the battery. The PiJuice reports charging current as
+    negative, so this is negative while charging.
+    """
+    if pijuice := SAMPLING_PIJUICE.get():
+        voltage = pijuice.status.GetBatteryVoltage()
+        current = pijuice.status.GetBatteryCurrent()
+        if voltage["error"] == "NO_ERROR" and current["error"] == "NO_ERROR":
+            return voltage["data"] * current["data"] / 1e6
+
+
+def get_battery_capacity_mah() -> Optional[int]:
+    """Capacity from the active battery profile, if the profile reports one."""
+    if pijuice := PIJUICE.get():
+        profile = pijuice.config.GetBatteryProfile()
+        if profile["error"] == "NO_ERROR" and isinstance(profile["data"], dict):
+            capacity = profile["data"]["capacity"]
+            if capacity != 0xFFFFFFFF:
+                return capacity
 
 
 def get_battery_info() -> dict:
     """Get comprehensive battery status information from PiJuice."""
-    if not pijuice_available:
+    snapshot = get_power_snapshot()
+    if snapshot is None:
         return {}
 
-    status = get_power_status()
-    charge_level = get_battery_level()
-
-    temp_result = PIJUICE.status.GetBatteryTemperature()
-    voltage_result = PIJUICE.status.GetBatteryVoltage()
-    current_result = PIJUICE.status.GetBatteryCurrent()
-    io_voltage_result = PIJUICE.status.GetIoVoltage()
-    io_current_result = PIJUICE.status.GetIoCurrent()
-    fault_result = PIJUICE.status.GetFaultStatus()
-    profile_result = PIJUICE.config.GetBatteryProfileStatus()
+    profile_result = PIJUICE.get().config.GetBatteryProfileStatus()
 
     battery_info = {
-        "status": status.get("battery"),
-        "charge_level": charge_level,
-        "power_input": status.get("powerInput"),
-        "power_input_5v": status.get("powerInput5vIo"),
-        "temperature_c": temp_result.get("data"),
-        "voltage_mv": voltage_result.get("data"),
-        "current_ma": current_result.get("data"),
-        "io_voltage_mv": io_voltage_result.get("data"),
-        "io_current_ma": io_current_result.get("data"),
-        "faults": fault_result.get("data", {}),
+        "status": snapshot.battery,
+        "charge_level": (
+            snapshot.charge_level / 100 if snapshot.charge_level is not None else None
+        ),
+        "power_input": snapshot.power_input,
+        "power_input_5v": snapshot.power_input_5v_io,
+        "temperature_c": snapshot.temperature_c,
+        "voltage_mv": snapshot.voltage_mv,
+        "current_ma": snapshot.current_ma,
+        "io_voltage_mv": snapshot.io_voltage_mv,
+        "io_current_ma": snapshot.io_current_ma,
+        "faults": snapshot.fault_status(),
+        "read_errors": dict(snapshot.errors),
         "profile": profile_result.get("data", {}),
     }
 
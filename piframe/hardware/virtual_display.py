@@ -0,0 +1,82 @@
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from piframe.hardware.display import (
+    CACHE_DIRECTORY,
+    DisplayBackend,
+    PALETTE,
+    PALETTE_CODES,
+    unpack_framebuffer,
+)
+
+# Rough phase durations of the 7.3" Spectra 6 panel, in seconds
+PANEL_TIMINGS = {
+    "init": 0.1,
+    "refresh": 19.0,
+    "sleep": 0.01,
+}
+# Default SPI clock of the waveshare driver
+SPI_HZ = 4_000_000
+PREVIEW_PATH = CACHE_DIRECTORY / "display_preview.png"
+
+# RGB for every 4-bit color code, magenta for codes the panel does not use
+CODE_COLORS = np.full((16, 3), [255, 0, 255], dtype=np.uint8)
+CODE_COLORS[PALETTE_CODES] = PALETTE
+
+
+class VirtualDisplay(DisplayBackend):
+    """
+    A display that writes what the panel would show to a PNG.
+
+    Each phase advances a virtual clock by how long the panel would take, so
+    session timings look like the hardware's. With realtime set, phases also
+    sleep for that long.
+    """
+
+    name = "virtual"
+
+    def __init__(
+        self,
+        preview_path: Optional[str] = str(PREVIEW_PATH),
+        realtime: bool = False,
+        timings: Optional[dict[str, float]] = None,
+        spi_hz: int = SPI_HZ,
+    ):
+        self._preview_path = Path(preview_path) if preview_path else None
+        self._realtime = realtime
+        self._timings = {**PANEL_TIMINGS, **(timings or {})}
+        self._spi_hz = spi_hz
+        self._clock = 0.0
+        self._pending: Optional[bytes] = None
+        self.preview: Optional[Image.Image] = None
+
+    def now(self) -> float:
+        return self._clock + time.perf_counter()
+
+    def _spend(self, seconds: float):
+        if self._realtime:
+            time.sleep(seconds)
+        else:
+            self._clock += seconds
+
+    def init(self):
+        self._spend(self._timings["init"])
+
+    def transfer(self, framebuffer: bytes):
+        self._pending = framebuffer
+        self._spend(self._timings.get("transfer", len(framebuffer) * 8 / self._spi_hz))
+
+    def refresh(self):
+        codes = unpack_framebuffer(np.frombuffer(self._pending, dtype=np.uint8))
+        self.preview = Image.fromarray(CODE_COLORS[codes])
+        if self._preview_path:
+            self._preview_path.parent.mkdir(parents=True, exist_ok=True)
+            self.preview.save(self._preview_path)
+        self._spend(self._timings["refresh"])
+
+    def sleep(self):
+        self._spend(self._timings["sleep"])
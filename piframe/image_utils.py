@@ -1,36 +1,72 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Literal, Optional
+
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+DitherMode = Literal["none", "ordered", "blue_noise", "diffusion"]
+
+
+def crop_box(
+    width: int, height: int, target_width: int, target_height: int
+) -> tuple[float, float, float, float]:
+    """The centered region of a width x height source that fills the target aspect ratio."""
+    scale = max(target_width / width, target_height / height)
+    box_width = target_width / scale
+    box_height = target_height / scale
+    left = (width - box_width) / 2
+    top = (height - box_height) / 2
+    return left, top, left + box_width, top + box_height
+
 
 def scale_and_crop(
     img: Image.Image,
     target_width: int,
     target_height: int,
     resample: int = Image.LANCZOS,
+    reducing_gap: Optional[float] = 3.0,
 ) -> Image.Image:
-    img_ratio = img.width / img.height
-    target_ratio = target_width / target_height
+    """
+    Scale an image to cover the target size and center crop the overflow.
 
-    if img_ratio > target_ratio:
-        new_height = target_height
-        new_width = int(img.width * (target_height / img.height))
-    else:
-        new_width = target_width
-        new_height = int(img.height * (target_width / img.width))
+    Only the source region that survives the crop is resampled, so no work is spent
+    on pixels that would be thrown away. Large downscales are first box-reduced by an
+    integer factor (see reducing_gap in Image.resize) before the final resample.
+    """
+    box = crop_box(img.width, img.height, target_width, target_height)
+    return img.resize(
+        (target_width, target_height), resample, box=box, reducing_gap=reducing_gap
+    )
 
-    resized_img = img.resize((new_width, new_height), resample)
 
-    left = (new_width - target_width) / 2
-    top = (new_height - target_height) / 2
-    right = left + target_width
-    bottom = top + target_height
-    cropped_img = resized_img.crop((left, top, right, bottom))
+# Title font sizes to try, largest first
+FONT_SIZES = list(range(20, 9, -2))
 
-    return cropped_img
+
+@lru_cache(maxsize=None)
+def _load_font(size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.load_default(size=size)
+
+
+def _fit_font_size(text: str, max_width: int) -> int:
+    """Binary search FONT_SIZES for the largest size whose text fits max_width."""
+    lo, hi = 0, len(FONT_SIZES) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _load_font(FONT_SIZES[mid]).getlength(text) <= max_width:
+            hi = mid
+        else:
+            lo = mid + 1
+    return FONT_SIZES[lo]
 
 
 def overlay_prompt(image: Image.Image, text: str) -> Image.Image:
     """
-    Overlay a text prompt on an image with a semi-transparent background.
+    Draw a text prompt in a title bar along the bottom of an image.
+
+    The bar is drawn in place, touching only the bottom strip, so no full-frame
+    copies are made. Images that are not RGB are converted first.
 
     Args:
         image (Image.Image): The input image.
@@ -39,21 +75,12 @@ def overlay_prompt(image: Image.Image, text: str) -> Image.Image:
     Returns:
         Image.Image: The image with the text overlay.
     """
-    # Ensure the image is in RGBA mode
-    image = image.convert("RGBA")
-
-    # Create a transparent overlay
-    overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
-
-    font_size = 20
-    font = ImageFont.load_default(size=font_size)
-    text_width = draw.textlength(text, font=font)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
 
-    while text_width > image.width and font_size > 10:
-        font_size -= 2
-        font = ImageFont.load_default(size=font_size)
-        text_width = draw.textlength(text, font=font)
+    font_size = _fit_font_size(text, image.width)
+    font = _load_font(font_size)
+    text_width = font.getlength(text)
 
     padding = 4
     background_height = font_size + 2 * padding
@@ -61,13 +88,11 @@ def overlay_prompt(image: Image.Image, text: str) -> Image.Image:
     text_x = (image.width - text_width) // 2
     text_y = image.height - background_height + padding / 2
 
-    # Draw the semi-transparent background
+    draw = ImageDraw.Draw(image)
     draw.rectangle(
         [(0, image.height - background_height), (image.width, image.height)],
-        fill=(0, 0, 0, 255),
+        fill=(0, 0, 0),
     )
-
-    # Draw the text
     draw.text(
         (text_x, text_y),
         text,
@@ -77,7 +102,185 @@ def overlay_prompt(image: Image.Image, text: str) -> Image.Image:
         stroke_width=1,
     )
 
-    # Combine the overlay with the original image
-    combined = Image.alpha_composite(image, overlay)
+    return image
+
+
+def srgb_to_oklab(rgb: np.ndarray) -> np.ndarray:
+    """Convert (..., 3) sRGB values in [0, 255] to OKLab."""
+    c = np.asarray(rgb, dtype=np.float64) / 255
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    lms = linear @ np.array(
+        [
+            [0.4122214708, 0.2119034982, 0.0883024619],
+            [0.5363325363, 0.6806995451, 0.2817188376],
+            [0.0514459929, 0.1073969566, 0.6299787005],
+        ]
+    )
+    return np.cbrt(lms) @ np.array(
+        [
+            [0.2104542553, 1.9779984951, 0.0259040371],
+            [0.7936177850, -2.4285922050, 0.7827717662],
+            [-0.0040720468, 0.4505937099, -0.8086757660],
+        ]
+    )
+
+
+def build_palette_lut(palette: np.ndarray, levels: int = 64) -> np.ndarray:
+    """
+    Dense RGB to palette index table, matched by distance in OKLab.
+
+    Entry [r, g, b] holds the palette index for the center of that bin, where each
+    channel is divided into levels bins.
+    """
+    centers = (np.arange(levels) + 0.5) * (256 / levels)
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1)
+    lab = srgb_to_oklab(grid).astype(np.float32)
+    palette_lab = srgb_to_oklab(palette).astype(np.float32)
+    lut = np.empty((levels,) * 3, dtype=np.uint8)
+    # One red plane at a time keeps the distance array small
+    for r in range(levels):
+        distances = ((lab[r, :, :, np.newaxis] - palette_lab) ** 2).sum(axis=-1)
+        lut[r] = distances.argmin(axis=-1)
+    return lut
+
+
+def load_palette_lut(path: Path, palette: np.ndarray, levels: int = 64) -> np.ndarray:
+    """Memory-map a palette lookup table, building and saving it on first use."""
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.partial")
+        with open(partial, "wb") as f:
+            np.save(f, build_palette_lut(palette, levels))
+        partial.replace(path)
+    return np.load(path, mmap_mode="r")
 
-    return combined.convert("RGB")
+
+def _nearest_color(
+    pixels: np.ndarray, palette: np.ndarray, lut: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Index of the closest palette color for each (..., 3) pixel."""
+    if lut is not None:
+        levels = lut.shape[0]
+        bins = (np.clip(pixels, 0, 255).astype(np.intp) * levels) >> 8
+        r, g, b = (bins[..., channel] for channel in range(3))
+        return lut.reshape(-1)[(r * levels + g) * levels + b]
+    palette = palette.astype(np.float32)
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, and |p|^2 does not change the argmin
+    distances = (palette**2).sum(axis=1) - 2 * (pixels @ palette.T)
+    return distances.argmin(axis=-1).astype(np.uint8)
+
+
+@lru_cache(maxsize=None)
+def bayer_matrix(order: int = 3) -> np.ndarray:
+    """Ordered dither thresholds in [-0.5, 0.5) for a 2^order square Bayer matrix."""
+    matrix = np.zeros((1, 1), dtype=np.float32)
+    for _ in range(order):
+        matrix = np.block(
+            [[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]]
+        )
+    return (matrix + 0.5) / matrix.size - 0.5
+
+
+@lru_cache(maxsize=None)
+def blue_noise(size: int = 64, seed: int = 7) -> np.ndarray:
+    """
+    Tileable blue noise thresholds in [-0.5, 0.5).
+
+    White noise is high-pass filtered in the frequency domain and its ranks are
+    spread uniformly, which is close enough to void-and-cluster for dithering.
+    """
+    noise = np.random.default_rng(seed).random((size, size))
+    frequencies = np.fft.fftfreq(size)
+    radius = np.hypot(*np.meshgrid(frequencies, frequencies))
+    filtered = np.fft.ifft2(np.fft.fft2(noise) * radius).real
+    ranks = filtered.ravel().argsort().argsort().reshape(size, size)
+    return ((ranks + 0.5) / ranks.size - 0.5).astype(np.float32)
+
+
+def _threshold_dither(
+    pixels: np.ndarray,
+    palette: np.ndarray,
+    thresholds: np.ndarray,
+    spread: float,
+    lut: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    height, width = pixels.shape[:2]
+    reps = (-(-height // thresholds.shape[0]), -(-width // thresholds.shape[1]))
+    tiled = np.tile(thresholds, reps)[:height, :width, np.newaxis]
+    return _nearest_color(pixels + tiled * spread, palette, lut)
+
+
+def _diffusion_dither(pixels: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """
+    Floyd-Steinberg error diffusion, vectorized along skewed rows.
+
+    A pixel only depends on its left neighbour and the three pixels above it, so
+    every pixel on the line x + 2y = t can be quantized at once. That replaces the
+    per-pixel loop with width + 2 * height vectorized steps and gives exactly the
+    same result as the serial algorithm.
+    """
+    height, width = pixels.shape[:2]
+    colors = palette.astype(np.float32)
+    # Nearest color by |c|^2 - 2 p.c, with the products folded into one matmul
+    weights = np.vstack([-2 * colors.T, (colors**2).sum(axis=1)])
+    # One column of padding on either side and a spare row below absorb the error
+    # that falls off the edges, so no step needs bounds checks.
+    stride = width + 2
+    work = np.zeros(((height + 1) * stride, 4), dtype=np.float32)
+    work.reshape(height + 1, stride, 4)[:height, 1:-1, :3] = pixels
+    work[:, 3] = 1
+    indices = np.empty(height * width, dtype=np.uint8)
+    below_offsets = np.array([stride - 1, stride, stride + 1])
+    below_weights = np.array([[3], [5], [1]], dtype=np.float32) / 16
+    all_ys = np.arange(height)
+    for t in range(width + 2 * (height - 1)):
+        ys = all_ys[max(0, (t - width + 2) // 2) : min(height - 1, t // 2) + 1]
+        xs = t - 2 * ys
+        cells = ys * stride + xs + 1
+        values = work[cells]
+        np.clip(values[:, :3], -128, 383, out=values[:, :3])
+        nearest = (values @ weights).argmin(axis=1)
+        indices[ys * width + xs] = nearest
+        error = values[:, :3] - colors[nearest]
+        # The right neighbour of one pixel is the lower left neighbour of the next
+        # pixel on the line, so it gets its own update rather than a fancy-index
+        # add that would drop one of the two contributions.
+        work[cells + 1, :3] += error * (7 / 16)
+        below = cells[:, np.newaxis] + below_offsets
+        work[below, :3] += error[:, np.newaxis, :] * below_weights
+    return indices.reshape(height, width)
+
+
+def quantize(
+    image: Image.Image,
+    palette: np.ndarray,
+    dither: DitherMode = "diffusion",
+    spread: float = 128.0,
+    lut: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Map an image onto a small fixed palette.
+
+    Args:
+        image (Image.Image): The input image.
+        palette (np.ndarray): (N, 3) RGB palette colors.
+        dither (DitherMode): none, ordered (8x8 Bayer), blue_noise or diffusion.
+        spread (float): Amplitude of the ordered and blue noise thresholds.
+        lut (np.ndarray): Optional table from build_palette_lut. Nearest colors are
+            then looked up in one indexing pass instead of searched for. Diffusion
+            always matches in RGB, since its error is carried in RGB and mixing
+            the two spaces makes the error drift.
+
+    Returns:
+        np.ndarray: (height, width) uint8 palette indices.
+    """
+    pixels = np.asarray(image.convert("RGB"), dtype=np.float32)
+    if dither == "none":
+        return _nearest_color(pixels, palette, lut)
+    if dither == "ordered":
+        return _threshold_dither(pixels, palette, bayer_matrix(), spread, lut)
+    if dither == "blue_noise":
+        return _threshold_dither(pixels, palette, blue_noise(), spread, lut)
+    if dither == "diffusion":
+        return _diffusion_dither(pixels, palette)
+    raise ValueError(f"Unknown dither mode {dither!r}")
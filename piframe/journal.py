@@ -0,0 +1,114 @@
+import json
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+JOURNAL_NAME = "run.journal.jsonl"
+
+
+def _read_proc_status_kb(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's high water mark so VmHWM reflects only the next stage."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb() -> int:
+    peak = _read_proc_status_kb("VmHWM")
+    if peak is None:
+        # ru_maxrss is in KB on Linux and only ever grows over the process lifetime
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak
+
+
+class RunJournal:
+    """
+    Collects per-stage timings and memory usage for a single wake.
+
+    Each stage records its duration, the peak RSS reached while it ran and, when
+    trace_memory is enabled, the tracemalloc peak and top allocation sites.
+    """
+
+    def __init__(
+        self,
+        trace_memory: bool = False,
+        memory_warning_mb: Optional[int] = None,
+        top_allocations: int = 3,
+    ):
+        self.timestamp = datetime.now().isoformat()
+        self.stages: list[dict] = []
+        self.metrics: dict = {}
+        self._trace_memory = trace_memory
+        self._memory_warning_kb = (
+            memory_warning_mb * 1024 if memory_warning_mb else None
+        )
+        self._top_allocations = top_allocations
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str):
+        record = {"stage": name, "started_at": time.time()}
+        peak_resettable = _reset_peak_rss()
+        if self._trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["duration_s"] = round(time.perf_counter() - start, 4)
+            record["ended_at"] = time.time()
+            record["rss_kb"] = _read_proc_status_kb("VmRSS")
+            record["peak_rss_kb"] = _peak_rss_kb()
+            record["peak_rss_is_stage_local"] = peak_resettable
+            if self._trace_memory:
+                _, traced_peak = tracemalloc.get_traced_memory()
+                record["tracemalloc_peak_kb"] = traced_peak // 1024
+                record["top_allocations"] = self._top_allocation_sites()
+            if (
+                self._memory_warning_kb is not None
+                and record["peak_rss_kb"] > self._memory_warning_kb
+            ):
+                record["over_memory_warning"] = True
+                print(
+                    f"Stage {name} peaked at {record['peak_rss_kb'] // 1024} MB, "
+                    f"over the {self._memory_warning_kb // 1024} MB warning."
+                )
+            self.stages.append(record)
+
+    def _top_allocation_sites(self) -> list[str]:
+        snapshot = tracemalloc.take_snapshot()
+        return [
+            f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} {stat.size // 1024} KB"
+            for stat in snapshot.statistics("lineno")[: self._top_allocations]
+        ]
+
+    def record(self, **metrics):
+        self.metrics.update(metrics)
+
+    def write(self, output_directory: str, log_name: str = JOURNAL_NAME):
+        entry = {
+            "timestamp": self.timestamp,
+            "stages": self.stages,
+            "metrics": self.metrics,
+        }
+        with open(Path(output_directory) / log_name, "a") as f:
+            f.write(json.dumps(entry) + "\n")
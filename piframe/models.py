@@ -9,6 +9,8 @@ import requests
 from PIL import Image
 from openai import OpenAI
 
+from piframe.prompts import estimate_tokens
+
 
 @dataclass
 class MessageContent:
@@ -25,15 +27,45 @@ class Message:
 T = TypeVar("T")
 
 
+def _open_image(image_bytes: bytes) -> Image.Image:
+    """Decode eagerly so the encoded bytes can be released as soon as we return."""
+    with BytesIO(image_bytes) as buffer:
+        image = Image.open(buffer)
+        image.load()
+    return image
+
+
 class Model(ABC, Generic[T]):
-    def __init__(self, model_id: str, *args, **kwargs):
+    # Rough prompt characters per token of the model's tokenizer
+    chars_per_token: float = 4.0
+    # Estimated tokens a prompt built for the model may use. Optional parts,
+    # such as recent history, are added until it is reached. A model class may
+    # set None for no limit.
+    prompt_tokens: Optional[int] = 400
+
+    def __init__(
+        self,
+        model_id: str,
+        *args,
+        chars_per_token: Optional[float] = None,
+        prompt_tokens: Optional[int] = None,
+        **kwargs,
+    ):
         self.model_id = model_id
         self._model_args = kwargs
+        # Either can be set per model in the config, as model args
+        if chars_per_token is not None:
+            self.chars_per_token = chars_per_token
+        if prompt_tokens is not None:
+            self.prompt_tokens = prompt_tokens
 
     @abstractmethod
     def invoke(self, messages: list[Message]) -> T:
         raise NotImplementedError
 
+    def estimate_tokens(self, text: str) -> int:
+        return estimate_tokens(text, self.chars_per_token)
+
 
 class BedrockModel(Model[T]):
     def __init__(self, client, *args, **kwargs):
@@ -47,6 +79,7 @@ class BedrockModel(Model[T]):
             modelId=self.model_id,
         )
         response_content = json.loads(response.get("body").read())
+        del response
         log_content = {k: v for k, v in response_content.items() if k != "images"}
         print(f"{log_content=}")
         return self._parse_response(response_content)
@@ -61,6 +94,8 @@ class BedrockModel(Model[T]):
 
 
 class Anthropic(BedrockModel[str]):
+    chars_per_token = 3.5
+
     def _get_request_body(self, messages: list[Message]) -> dict:
         messages = [asdict(message) for message in messages]
         return {
@@ -96,8 +131,8 @@ class StableImage(BedrockModel[Image.Image]):
         }
 
     def _parse_response(self, response: dict) -> Image.Image:
-        image_bytes = b64decode(response["images"][0])
-        return Image.open(BytesIO(image_bytes))
+        image_bytes = b64decode(response["images"].pop(0))
+        return _open_image(image_bytes)
 
 
 class StableXL(BedrockModel[Image.Image]):
@@ -112,8 +147,8 @@ class StableXL(BedrockModel[Image.Image]):
         }
 
     def _parse_response(self, response: dict) -> Image.Image:
-        image_bytes = b64decode(response.get("artifacts")[0].get("base64"))
-        return Image.open(BytesIO(image_bytes))
+        image_bytes = b64decode(response.get("artifacts")[0].pop("base64"))
+        return _open_image(image_bytes)
 
 
 class TitanImage(BedrockModel[Image.Image]):
@@ -130,8 +165,8 @@ class TitanImage(BedrockModel[Image.Image]):
         }
 
     def _parse_response(self, response: dict) -> Image.Image:
-        image_bytes = b64decode(response.get("images")[0].encode())
-        return Image.open(BytesIO(image_bytes))
+        image_bytes = b64decode(response.get("images").pop(0).encode())
+        return _open_image(image_bytes)
 
 
 class StableApi(Model[Image.Image]):
@@ -168,7 +203,7 @@ class StableApi(Model[Image.Image]):
             },
         )
         response.raise_for_status()
-        return Image.open(BytesIO(response.content))
+        return _open_image(response.content)
 
     @property
     @abstractmethod
@@ -223,6 +258,6 @@ class OpenAIImage(OpenAIModel[Image.Image]):
             output_compression=99,
             **self._model_args,
         )
-        image_base64 = result.data[0].b64_json
-        image_bytes = b64decode(image_base64)
-        return Image.open(BytesIO(image_bytes))
+        image_bytes = b64decode(result.data[0].b64_json)
+        del result
+        return _open_image(image_bytes)
@@ -0,0 +1,225 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from piframe.hardware import display
+
+# Rec. 601 luma weights
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class Stage(ABC):
+    """A preprocessing step on float32 RGB pixels in [0, 255]."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @abstractmethod
+    def apply(self, pixels: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class ColorTransform(Stage):
+    """
+    A stage that is an affine map of each pixel's RGB.
+
+    Runs of these are multiplied into a single matrix and applied in one pass.
+    """
+
+    @abstractmethod
+    def matrix(self) -> np.ndarray:
+        """(4, 4) homogeneous matrix taking [r, g, b, 1] to the output."""
+        raise NotImplementedError
+
+    def apply(self, pixels: np.ndarray) -> np.ndarray:
+        return _apply_affine(pixels, self.matrix())
+
+
+class ToneCurve(Stage):
+    """
+    A stage that maps each 8-bit channel value through a 256 entry curve.
+
+    The curve may depend on the image, but only through its luma histogram, so
+    runs of curves can be composed without touching the pixels and applied with
+    one lookup.
+    """
+
+    @abstractmethod
+    def curve(self, histogram: np.ndarray) -> np.ndarray:
+        """(256,) output values for each input value, given a 256 bin luma histogram."""
+        raise NotImplementedError
+
+    def apply(self, pixels: np.ndarray) -> np.ndarray:
+        return _apply_curve(pixels, self.curve(_luma_histogram(pixels)))
+
+
+def _apply_affine(pixels: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    return pixels @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def _apply_curve(pixels: np.ndarray, curve: np.ndarray) -> np.ndarray:
+    values = np.clip(pixels, 0, 255).astype(np.uint8)
+    return curve.astype(np.float32)[values]
+
+
+def _luma_histogram(pixels: np.ndarray) -> np.ndarray:
+    luma = np.clip(pixels @ LUMA, 0, 255).astype(np.uint8)
+    return np.bincount(luma.ravel(), minlength=256)
+
+
+class Saturation(ColorTransform):
+    def __init__(self, factor: float = 1.3):
+        super().__init__()
+        self._factor = factor
+
+    def matrix(self) -> np.ndarray:
+        # Blend each pixel away from its own luma
+        gray = np.tile(LUMA, (3, 1))
+        matrix = np.eye(4, dtype=np.float32)
+        matrix[:3, :3] = gray + self._factor * (np.eye(3) - gray)
+        return matrix
+
+
+class Contrast(ColorTransform):
+    def __init__(self, factor: float = 1.2, pivot: float = 128.0):
+        super().__init__()
+        self._factor = factor
+        self._pivot = pivot
+
+    def matrix(self) -> np.ndarray:
+        matrix = np.eye(4, dtype=np.float32)
+        matrix[:3, :3] *= self._factor
+        matrix[:3, 3] = self._pivot * (1 - self._factor)
+        return matrix
+
+
+class Gamma(ToneCurve):
+    def __init__(self, gamma: float = 0.9):
+        super().__init__()
+        self._gamma = gamma
+
+    def curve(self, histogram: np.ndarray) -> np.ndarray:
+        return 255 * (np.arange(256) / 255) ** self._gamma
+
+
+class PaletteToneMap(ToneCurve):
+    """
+    Stretch the image's luma range onto the range the panel palette covers.
+
+    The low and high percentiles of luma are mapped to the darkest and lightest
+    palette colors, so shadows and highlights land on real panel colors instead
+    of being dithered from mid-tones.
+    """
+
+    def __init__(
+        self,
+        low_percentile: float = 1.0,
+        high_percentile: float = 99.0,
+        palette: Optional[list[list[int]]] = None,
+    ):
+        super().__init__()
+        self._low_percentile = low_percentile
+        self._high_percentile = high_percentile
+        palette = display.PALETTE if palette is None else palette
+        palette_luma = np.asarray(palette, dtype=np.float32) @ LUMA
+        self._black = float(palette_luma.min())
+        self._white = float(palette_luma.max())
+
+    def curve(self, histogram: np.ndarray) -> np.ndarray:
+        cumulative = np.cumsum(histogram) / max(histogram.sum(), 1)
+        low = np.searchsorted(cumulative, self._low_percentile / 100)
+        high = max(np.searchsorted(cumulative, self._high_percentile / 100), low + 1)
+        scale = (self._white - self._black) / (high - low)
+        return np.clip((np.arange(256) - low) * scale + self._black, 0, 255)
+
+
+class UnsharpMask(Stage):
+    """Sharpen by adding back the difference from a box-blurred copy."""
+
+    def __init__(self, radius: int = 2, amount: float = 0.6, threshold: float = 2.0):
+        super().__init__()
+        self._radius = radius
+        self._amount = amount
+        self._threshold = threshold
+
+    def _box_blur(self, pixels: np.ndarray, axis: int) -> np.ndarray:
+        size = 2 * self._radius + 1
+        pad = [(0, 0)] * pixels.ndim
+        pad[axis] = (self._radius + 1, self._radius)
+        cumulative = np.cumsum(np.pad(pixels, pad, mode="edge"), axis=axis)
+        n = pixels.shape[axis]
+        upper = np.take(cumulative, np.arange(size, size + n), axis=axis)
+        lower = np.take(cumulative, np.arange(n), axis=axis)
+        return (upper - lower) / size
+
+    def apply(self, pixels: np.ndarray) -> np.ndarray:
+        blurred = self._box_blur(self._box_blur(pixels, 0), 1)
+        detail = pixels - blurred
+        detail[np.abs(detail) < self._threshold] = 0
+        return pixels + self._amount * detail
+
+
+def _fusion_kind(stage: Stage) -> Optional[type]:
+    for kind in (ColorTransform, ToneCurve):
+        if isinstance(stage, kind):
+            return kind
+    return None
+
+
+class Pipeline:
+    """
+    Runs stages in order, fusing adjacent stages where it can.
+
+    Adjacent ColorTransforms become one matrix multiply and adjacent ToneCurves
+    one lookup, so the number of full-frame passes is the number of runs rather
+    than the number of stages.
+    """
+
+    def __init__(self, stages: list[Stage]):
+        self.stages = stages
+        self.timings: dict[str, float] = {}
+
+    def _runs(self) -> list[list[Stage]]:
+        runs: list[list[Stage]] = []
+        for stage in self.stages:
+            kind = _fusion_kind(stage)
+            if runs and kind is not None and kind is _fusion_kind(runs[-1][0]):
+                runs[-1].append(stage)
+            else:
+                runs.append([stage])
+        return runs
+
+    def _apply_run(self, run: list[Stage], pixels: np.ndarray) -> np.ndarray:
+        if len(run) == 1:
+            return run[0].apply(pixels)
+        if isinstance(run[0], ColorTransform):
+            matrix = np.eye(4, dtype=np.float32)
+            for stage in run:
+                matrix = stage.matrix() @ matrix
+            return _apply_affine(pixels, matrix)
+        # Compose curves, pushing the luma histogram through each one so
+        # data-dependent curves see roughly the distribution they would have seen
+        # unfused. It is only an approximation, as the curves apply per channel
+        # and the luma of a curved pixel is not the curve of its luma.
+        histogram = _luma_histogram(pixels)
+        composed = np.arange(256, dtype=np.float32)
+        for stage in run:
+            curve = stage.curve(histogram)
+            composed = curve[np.clip(composed, 0, 255).astype(np.uint8)]
+            mapped = np.clip(curve, 0, 255).astype(np.uint8)
+            histogram = np.bincount(mapped, weights=histogram, minlength=256)
+        return _apply_curve(pixels, composed)
+
+    def apply(self, image: Image.Image) -> Image.Image:
+        if not self.stages:
+            return image
+        pixels = np.asarray(image.convert("RGB"), dtype=np.float32)
+        for run in self._runs():
+            start = time.perf_counter()
+            pixels = self._apply_run(run, pixels)
+            name = "+".join(type(stage).__name__ for stage in run)
+            self.timings[name] = time.perf_counter() - start
+        return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
@@ -1,8 +1,14 @@
+import hashlib
+import json
+import math
+import os
 import random
+import re
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Iterable, Optional
+from pathlib import Path
+from typing import Callable, Iterable, Optional
 
 from piframe.weather import Weather
 
@@ -74,7 +80,7 @@ Use the following context to tailor your descriptions
 - holiday themes on known holidays
 
 {context}
-
+{history}
 Write a description about {topic}.
 
 Respond only with the image description in plain text.
@@ -92,10 +98,75 @@ Respond only with the title in plain text.
 """
 
 
+# Words that carry no subject or setting on their own
+STOPWORDS = frozenset(
+    "a an and the of with while its their his her is are as to by from into onto "
+    "each every some very who which that this these those it they them over across "
+    "through around".split()
+)
+# Prepositions that introduce where a description takes place
+SETTING_WORDS = frozenset(
+    "in on at under inside atop beneath amid among beside near behind within".split()
+)
+# Words after a preposition that make it part of the subject, as in "a knight
+# among three dragons", rather than its setting
+QUANTIFIERS = frozenset(
+    "one two three four five six seven eight nine ten dozens hundreds several "
+    "many few both all".split()
+)
+FINGERPRINT_WORDS = 4
+
+
+def _content_words(words: list[str]) -> list[str]:
+    skip = STOPWORDS | SETTING_WORDS | {","}
+    return [word for word in words if word not in skip]
+
+
+def _setting_start(words: list[str]) -> int:
+    """Where the first setting phrase after some subject starts."""
+    for i in range(1, len(words) - 1):
+        if (
+            words[i] in SETTING_WORDS
+            and words[i + 1] not in QUANTIFIERS
+            and _content_words(words[:i])
+        ):
+            return i
+    return len(words)
+
+
+def fingerprint(description: str, image_prompt: Optional[str] = None) -> str:
+    """
+    A few keywords standing in for a past description: its subject, its
+    setting and, when the image prompt is known, the style it was drawn in.
+    """
+    words = re.findall(r"[a-z][a-z'-]*|,", description.lower())
+    if words and words[0] in SETTING_WORDS and "," in words:
+        # A leading phrase, as in "Under a stormy sky, ...", is the setting
+        comma = words.index(",")
+        subject, setting = words[comma + 1 :], words[1:comma]
+        subject = subject[: _setting_start(subject)]
+    else:
+        split = _setting_start(words)
+        subject, setting = words[:split], words[split + 1 :]
+    parts = [
+        " ".join(_content_words(subject)[:FINGERPRINT_WORDS]),
+        " ".join(_content_words(setting)[:FINGERPRINT_WORDS]),
+    ]
+    if image_prompt and image_prompt.startswith(description.rstrip(".")):
+        style = image_prompt[len(description.rstrip(".")) :].lstrip(". ")
+        parts.append(style.split(",")[0])
+    return " / ".join(part for part in parts if part)
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    return math.ceil(len(text) / chars_per_token)
+
+
 @dataclass
 class PromptContext:
     battery_level: float
     weather: Weather
+    # Fingerprints of recent descriptions, most recent first
     history: Iterable[str]
 
 
@@ -122,16 +193,96 @@ class RandomAdlib(TopicStrategy):
         return f"{adjective} {noun}"
 
 
-def image_description_prompt(topic_strategy: TopicStrategy, context: PromptContext):
+FEISTEL_ROUNDS = 4
+
+
+def _feistel_permute(index: int, size: int, key: int) -> int:
+    """
+    Position of index in a keyed pseudorandom permutation of range(size).
+
+    A balanced Feistel network permutes the smallest even-bit-width domain
+    covering size. Values that land outside range(size) are encrypted again
+    until they fall inside it (cycle walking), which stays a permutation and
+    takes under four steps on average.
+    """
+    half_bits = max(1, (size - 1).bit_length() + 1) // 2
+    mask = (1 << half_bits) - 1
+    value = index
+    while True:
+        left, right = value >> half_bits, value & mask
+        for round_ in range(FEISTEL_ROUNDS):
+            digest = hashlib.blake2b(
+                f"{round_}:{right}".encode(), digest_size=8, key=key.to_bytes(8, "big")
+            ).digest()
+            left, right = right, left ^ (int.from_bytes(digest, "big") & mask)
+        value = (left << half_bits) | right
+        if value < size:
+            return value
+
+
+class ShuffleBagAdlib(TopicStrategy):
+    """
+    Draws every adjective and noun combination once, in shuffled order, before
+    repeating any.
+
+    Only a key, the number of draws so far and the size of the combination space
+    are stored, so each draw is constant time and space however large the
+    vocabulary. A new key is picked each time the bag empties or the vocabulary
+    changes size.
+    """
+
+    def __init__(
+        self,
+        adjectives: Optional[list[str]] = None,
+        nouns: Optional[list[str]] = None,
+        state_path: str = "~/.cache/piframe/shuffle_bag.json",
+    ):
+        super().__init__()
+        self._adjectives = adjectives or ADJECTIVES
+        self._nouns = nouns or NOUNS
+        self._state_path = Path(state_path).expanduser()
+
+    def _load_state(self, size: int) -> dict:
+        try:
+            with open(self._state_path) as f:
+                state = json.load(f)
+            if state["size"] == size and state["position"] < size:
+                return state
+        except (FileNotFoundError, KeyError, ValueError):
+            pass
+        return {"seed": random.getrandbits(64), "position": 0, "size": size}
+
+    def _save_state(self, state: dict):
+        self._state_path.parent.mkdir(parents=True, exist_ok=True)
+        partial = self._state_path.with_suffix(".partial")
+        with open(partial, "w") as f:
+            json.dump(state, f)
+        os.replace(partial, self._state_path)
+
+    def get_topic(self, context: PromptContext):
+        size = len(self._adjectives) * len(self._nouns)
+        state = self._load_state(size)
+        combination = _feistel_permute(state["position"], size, state["seed"])
+        state["position"] += 1
+        self._save_state(state)
+        adjective, noun = divmod(combination, len(self._nouns))
+        return f"{self._adjectives[adjective]} {self._nouns[noun]}"
+
+
+def image_description_prompt(
+    topic_strategy: TopicStrategy,
+    context: PromptContext,
+    token_budget: Optional[int] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+):
+    """
+    With a token budget, history fingerprints are added most recent first for
+    as long as the prompt stays within it.
+    """
     timestamp = datetime.now()
     date_str = timestamp.strftime("%A, %B %d, %Y")
     time_str = timestamp.strftime("%I:%M %p")
 
-    history_str = ""
-    if context.history:
-        history_str = "Do not repeat concepts. Here are some recent descriptions you've generated:\n"
-        history_str += "\n".join([f"- {desc}" for desc in context.history])
-
     contexts = [
         f"- Date: {date_str}",
         f"- Time: {time_str}",
@@ -150,10 +301,29 @@ def image_description_prompt(topic_strategy: TopicStrategy, context: PromptConte
         if timestamp.hour >= 18:
             topic = f"{topic} at happy hour"
 
+    prompt = IMAGE_DESCRIPTION_PROMPT.format(
+        context=context_str, topic=topic, history=""
+    )
+    history_lines = []
+    used = count_tokens(prompt)
+    for entry in context.history:
+        line = f"- {entry}"
+        if not history_lines:
+            line = (
+                f"\nAvoid repeating these recent subjects / settings / styles:\n{line}"
+            )
+        cost = count_tokens(line + "\n")
+        if token_budget is not None and used + cost > token_budget:
+            break
+        history_lines.append(line)
+        used += cost
+    if not history_lines:
+        return prompt
+
     return IMAGE_DESCRIPTION_PROMPT.format(
         context=context_str,
         topic=topic,
-        history=history_str,
+        history="\n".join(history_lines) + "\n",
     )
 
 
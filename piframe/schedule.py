@@ -0,0 +1,213 @@
+import csv
+import json
+import math
+import random
+import statistics
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from croniter import croniter
+from PIL.Image import Image
+from pydantic import BaseModel
+
+from piframe import models
+from piframe.hardware import display
+from piframe.journal import JOURNAL_NAME
+from piframe.reflection import ModuleDefinition
+
+BATTERY_LOG_NAME = "battery.log.csv"
+# Upcoming cron wakes looked at when planning, so a frequent schedule with a long
+# target runtime stays cheap to plan
+MAX_PLANNED_WAKES = 10_000
+
+
+class QualityTier(BaseModel):
+    """
+    Cheaper settings used while on battery at or below max_charge.
+
+    Model definitions replace the configured ones, e.g. a faster model or a
+    smaller image size. An archived tier shows a previously generated
+    framebuffer again instead of generating anything.
+    """
+
+    name: str
+    max_charge: float
+    description_model: Optional[ModuleDefinition[models.Model[str]]] = None
+    image_model: Optional[ModuleDefinition[models.Model[Image]]] = None
+    image_candidates: Optional[int] = None
+    archived: bool = False
+
+    def overrides(self) -> dict:
+        return {
+            field: value
+            for field in ("description_model", "image_model", "image_candidates")
+            if (value := getattr(self, field)) is not None
+        }
+
+
+class PowerBudget(BaseModel):
+    """
+    Stretches the schedule while on battery so the charge lasts
+    target_runtime_hours after leaving the charger.
+
+    Wake and sleep costs are measured from the run journal and the battery log
+    once there is history to measure them from. The defaults are used until then.
+    """
+
+    target_runtime_hours: float
+    # Charge never planned to be spent
+    reserve: float = 0.05
+    # Used when the PiJuice battery profile does not report a capacity
+    capacity_mah: Optional[int] = None
+    nominal_voltage_v: float = 3.7
+    default_wake_energy_j: float = 150.0
+    default_sleep_power_w: float = 0.01
+    # Wakes are never stretched further apart than this
+    max_interval_hours: float = 72.0
+    tiers: list[QualityTier] = []
+
+    def capacity_j(self, capacity_mah: Optional[int]) -> Optional[float]:
+        capacity_mah = capacity_mah or self.capacity_mah
+        if capacity_mah is None:
+            return None
+        return capacity_mah / 1000 * self.nominal_voltage_v * 3600
+
+    def select_tier(self, charge: float) -> Optional[QualityTier]:
+        """The cheapest tier the charge is within, if any."""
+        eligible = [tier for tier in self.tiers if charge <= tier.max_charge]
+        return min(eligible, key=lambda tier: tier.max_charge, default=None)
+
+
+@dataclass
+class WakePlan:
+    wakeup: datetime
+    # Scheduled wakes skipped to stay within the budget
+    skipped: int = 0
+    affordable_wakes: Optional[float] = None
+    scheduled_wakes: Optional[int] = None
+
+
+def pick_archived(artifact_directory: str) -> Optional[Path]:
+    """A random archived image that has a stored framebuffer."""
+    images = [
+        path
+        for path in (Path(artifact_directory) / "images").glob("*.jpg")
+        if display.framebuffer_path(path).exists()
+    ]
+    return random.choice(images) if images else None
+
+
+def measure_wake_energy(
+    artifact_directory: str, tier: Optional[str], recent: int = 20
+) -> Optional[float]:
+    """Median joules drawn by recent battery-powered wakes of the same tier."""
+    energies = deque(maxlen=recent)
+    try:
+        with open(Path(artifact_directory) / JOURNAL_NAME) as f:
+            for line in f:
+                metrics = json.loads(line).get("metrics", {})
+                energy = metrics.get("energy_j")
+                if energy and energy > 0 and metrics.get("quality_tier") == tier:
+                    energies.append(energy)
+    except FileNotFoundError:
+        pass
+    return statistics.median(energies) if energies else None
+
+
+def _on_battery(row: dict) -> bool:
+    return (
+        row["power_input"] == "NOT_PRESENT" and row["power_input_5v"] == "NOT_PRESENT"
+    )
+
+
+def read_battery_log(artifact_directory: str) -> list[dict]:
+    try:
+        with open(Path(artifact_directory) / BATTERY_LOG_NAME, newline="") as f:
+            return list(csv.DictReader(f))
+    except FileNotFoundError:
+        return []
+
+
+def off_charger_since(battery_log: list[dict]) -> Optional[datetime]:
+    """When the last battery log entry taken on external power was written."""
+    for row in reversed(battery_log):
+        if not _on_battery(row):
+            return datetime.fromisoformat(row["timestamp"])
+    return datetime.fromisoformat(battery_log[0]["timestamp"]) if battery_log else None
+
+
+def measure_sleep_power(
+    battery_log: list[dict], capacity_j: float, wake_energy_j: float, recent: int = 50
+) -> Optional[float]:
+    """
+    Average watts drawn between wakes, from the charge lost between consecutive
+    battery-powered log entries less the energy the wakes themselves drew.
+    """
+    drop, seconds, wakes = 0.0, 0.0, 0
+    rows = battery_log[-recent:]
+    for previous, current in zip(rows, rows[1:]):
+        if not (_on_battery(previous) and _on_battery(current)):
+            continue
+        # The charge level is left empty when it could not be read
+        if not (previous["battery_level"] and current["battery_level"]):
+            continue
+        drop += float(previous["battery_level"]) - float(current["battery_level"])
+        seconds += (
+            datetime.fromisoformat(current["timestamp"])
+            - datetime.fromisoformat(previous["timestamp"])
+        ).total_seconds()
+        wakes += 1
+    # The charge level is only reported in whole percent
+    if seconds <= 0 or drop < 0.02:
+        return None
+    return max(0.0, (drop * capacity_j - wakes * wake_energy_j) / seconds)
+
+
+def plan_wakeup(
+    schedule: str,
+    budget: PowerBudget,
+    charge: float,
+    capacity_j: float,
+    wake_energy_j: float,
+    sleep_power_w: float,
+    off_charger_at: Optional[datetime],
+    now: Optional[datetime] = None,
+) -> WakePlan:
+    """
+    The next wake that keeps the remaining charge lasting until the target
+    runtime is reached.
+
+    When the charge cannot pay for every scheduled wake until then, wakes are
+    skipped evenly, so the frame keeps waking at the times the schedule names.
+    Past the target runtime, the charge is planned over max_interval_hours.
+    """
+    now = now or datetime.now()
+    max_interval = timedelta(hours=budget.max_interval_hours)
+    elapsed = now - (off_charger_at or now)
+    horizon = max(timedelta(hours=budget.target_runtime_hours) - elapsed, max_interval)
+
+    cron = croniter(schedule, now)
+    wakes = []
+    while len(wakes) < MAX_PLANNED_WAKES:
+        wake = cron.get_next(datetime)
+        if wakes and wake > now + horizon:
+            break
+        wakes.append(wake)
+
+    available_j = (charge - budget.reserve) * capacity_j
+    available_j -= sleep_power_w * horizon.total_seconds()
+    affordable = max(available_j, 0.0) / wake_energy_j
+    skipped = 0
+    if affordable < len(wakes):
+        skipped = math.ceil(len(wakes) / max(affordable, 1.0)) - 1
+    reachable = [wake for wake in wakes if wake <= now + max_interval] or wakes[:1]
+    skipped = min(skipped, len(reachable) - 1)
+    return WakePlan(
+        wakeup=reachable[skipped],
+        skipped=skipped,
+        affordable_wakes=round(affordable, 1),
+        scheduled_wakes=len(wakes),
+    )
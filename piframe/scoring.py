@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from piframe import image_utils
+
+# Height of the title bar overlay_prompt draws at its largest font size
+TITLE_STRIP_HEIGHT = 28
+
+
+@dataclass(frozen=True)
+class ImageScore:
+    """
+    How well an image should survive the trip to an e-ink panel.
+
+    quantization_error: Mean OKLab distance from each pixel to its nearest palette
+        color. Lower means less dithering noise.
+    contrast: Standard deviation of OKLab lightness.
+    title_strip_detail: Mean OKLab gradient in the bottom strip the title bar
+        covers. Lower means less of the picture is hidden by the title.
+    """
+
+    quantization_error: float
+    contrast: float
+    title_strip_detail: float
+
+    def total(
+        self,
+        quantization_weight: float = 1.0,
+        contrast_weight: float = 1.0,
+        title_strip_weight: float = 0.5,
+    ) -> float:
+        return (
+            contrast_weight * self.contrast
+            - quantization_weight * self.quantization_error
+            - title_strip_weight * self.title_strip_detail
+        )
+
+
+def score_image(
+    image: Image.Image,
+    palette: np.ndarray,
+    lut: np.ndarray,
+    reduce: int = 4,
+    title_strip_height: int = TITLE_STRIP_HEIGHT,
+) -> ImageScore:
+    """
+    Score a display-sized image against a panel palette.
+
+    Scoring runs on a copy box-reduced by the given factor, which keeps it fast
+    enough for the device without changing the ranking much.
+    """
+    small = image.convert("RGB").reduce(reduce)
+    pixels = np.asarray(small, dtype=np.float32)
+    lab = image_utils.srgb_to_oklab(pixels)
+    palette_lab = image_utils.srgb_to_oklab(palette)
+
+    nearest = image_utils.quantize(small, palette, dither="none", lut=lut)
+    quantization_error = np.linalg.norm(lab - palette_lab[nearest], axis=-1).mean()
+
+    strip = lab[-max(1, title_strip_height // reduce) :]
+    gradients = (
+        np.abs(np.diff(strip, axis=0)).sum(axis=-1).mean()
+        + np.abs(np.diff(strip, axis=1)).sum(axis=-1).mean()
+    )
+
+    return ImageScore(
+        quantization_error=float(quantization_error),
+        contrast=float(lab[..., 0].std()),
+        title_strip_detail=float(gradients),
+    )
@@ -1,8 +1,20 @@
+import bisect
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Optional
 
 import requests
 
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+# SF
+DEFAULT_LATITUDE = 37.790812
+DEFAULT_LONGITUDE = -122.418431
+
 WEATHER_CODE_MAPPING = {
     0: "Clear",
     1: "Mostly Clear",
@@ -41,23 +53,163 @@ class Weather:
     description: str
 
 
-def get_current_weather() -> Optional[Weather]:
-    # SF
-    url = f"https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": 37.790812,
-        "longitude": -122.418431,
-        "current_weather": "true",
-        "temperature_unit": "fahrenheit",
-    }
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        current_weather = data.get("current_weather", {})
-        temperature = current_weather["temperature"]
-        weather_code = current_weather.get("weathercode")
-        description = WEATHER_CODE_MAPPING.get(weather_code)
+class WeatherProvider(ABC):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def prefetch(self):
+        """Start any slow fetching early. get_weather may be called right after."""
+        pass
+
+    @abstractmethod
+    def get_weather(self) -> Optional[Weather]:
+        raise NotImplementedError
+
+
+class OpenMeteo(WeatherProvider):
+    """Current conditions, fetched on every call."""
+
+    def __init__(
+        self,
+        latitude: float = DEFAULT_LATITUDE,
+        longitude: float = DEFAULT_LONGITUDE,
+        timeout: float = 5.0,
+    ):
+        super().__init__()
+        self._latitude = latitude
+        self._longitude = longitude
+        self._timeout = timeout
+
+    def get_weather(self) -> Optional[Weather]:
+        params = {
+            "latitude": self._latitude,
+            "longitude": self._longitude,
+            "current_weather": "true",
+            "temperature_unit": "fahrenheit",
+        }
+        try:
+            response = requests.get(
+                OPEN_METEO_URL, params=params, timeout=self._timeout
+            )
+        except requests.RequestException as e:
+            print(f"Failed to fetch weather: {e!r}")
+            return None
+        if response.status_code == 200:
+            data = response.json()
+            current_weather = data.get("current_weather", {})
+            temperature = current_weather["temperature"]
+            weather_code = current_weather.get("weathercode")
+            description = WEATHER_CODE_MAPPING.get(weather_code)
+            return Weather(
+                temperature=temperature,
+                description=description,
+            )
+
+
+class CachedForecast(WeatherProvider):
+    """
+    Current conditions read from an hourly forecast cached on disk.
+
+    The forecast covers the next forecast_hours and is refetched once it is older
+    than ttl_hours. A stale forecast that still covers the current hour is
+    served immediately while the refetch runs in the background, so the network
+    is only waited on when there is nothing usable cached.
+    """
+
+    def __init__(
+        self,
+        latitude: float = DEFAULT_LATITUDE,
+        longitude: float = DEFAULT_LONGITUDE,
+        cache_path: str = "~/.cache/piframe/forecast.json",
+        ttl_hours: float = 6.0,
+        forecast_hours: int = 48,
+        timeout: float = 5.0,
+    ):
+        super().__init__()
+        self._latitude = latitude
+        self._longitude = longitude
+        self._cache_path = Path(cache_path).expanduser()
+        self._ttl = ttl_hours * 3600
+        self._forecast_hours = forecast_hours
+        self._timeout = timeout
+        self._refresh: Optional[threading.Thread] = None
+
+    def _load(self) -> Optional[dict]:
+        try:
+            with open(self._cache_path) as f:
+                forecast = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if (forecast.get("latitude"), forecast.get("longitude")) != (
+            self._latitude,
+            self._longitude,
+        ):
+            return None
+        return forecast
+
+    def _fetch(self) -> Optional[dict]:
+        params = {
+            "latitude": self._latitude,
+            "longitude": self._longitude,
+            "hourly": "temperature_2m,weather_code",
+            "forecast_hours": self._forecast_hours,
+            "temperature_unit": "fahrenheit",
+            "timeformat": "unixtime",
+        }
+        try:
+            response = requests.get(
+                OPEN_METEO_URL, params=params, timeout=self._timeout
+            )
+            response.raise_for_status()
+            hourly = response.json()["hourly"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print(f"Failed to fetch weather forecast: {e!r}")
+            return None
+        forecast = {
+            "latitude": self._latitude,
+            "longitude": self._longitude,
+            "fetched_at": time.time(),
+            "time": hourly["time"],
+            "temperature": hourly["temperature_2m"],
+            "weather_code": hourly["weather_code"],
+        }
+        self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+        partial = self._cache_path.with_suffix(".partial")
+        with open(partial, "w") as f:
+            json.dump(forecast, f)
+        os.replace(partial, self._cache_path)
+        return forecast
+
+    def prefetch(self):
+        """Refetch the forecast in the background if it is missing or stale."""
+        if self._refresh is not None and self._refresh.is_alive():
+            return
+        forecast = self._load()
+        if forecast is None or time.time() - forecast["fetched_at"] > self._ttl:
+            self._refresh = threading.Thread(target=self._fetch, name="forecast")
+            self._refresh.start()
+
+    @staticmethod
+    def _at(forecast: Optional[dict], timestamp: float) -> Optional[Weather]:
+        if not forecast or not forecast["time"]:
+            return None
+        hour = bisect.bisect_right(forecast["time"], timestamp) - 1
+        if hour < 0 or timestamp >= forecast["time"][hour] + 3600:
+            return None
         return Weather(
-            temperature=temperature,
-            description=description,
+            temperature=forecast["temperature"][hour],
+            description=WEATHER_CODE_MAPPING.get(forecast["weather_code"][hour]),
         )
+
+    def get_weather(self) -> Optional[Weather]:
+        self.prefetch()
+        now = time.time()
+        if weather := self._at(self._load(), now):
+            return weather
+        if self._refresh is not None:
+            self._refresh.join(self._timeout)
+        return self._at(self._load(), now)
+
+
+def get_current_weather() -> Optional[Weather]:
+    return OpenMeteo().get_weather()
@@ -7,6 +7,7 @@ setup(
     entry_points={
         'console_scripts': [
             'update-frame = piframe.app.update_frame:update_frame',
+            'piframe-broker = piframe.hardware.broker:main',
         ],
     },
     description="Digital Raspberry Pi Zero W e-ink AI picture frame.",
@@ -0,0 +1,104 @@
+import socket
+import threading
+
+import pytest
+
+from piframe.hardware import broker, display
+from piframe.hardware.pijuice import PiJuiceInterface
+from piframe.hardware.pijuice_registers import REGISTERS
+from piframe.hardware.pijuice_sim import SimulatedPiJuice
+
+
+class CountingInterface(PiJuiceInterface):
+    def __init__(self):
+        super().__init__(i2cbus=SimulatedPiJuice())
+        self.reads = 0
+
+    def ReadData(self, cmd, length):
+        self.reads += 1
+        return super().ReadData(cmd, length)
+
+
+class RecordingDisplay(display.DisplayBackend):
+    name = "recording"
+
+    def __init__(self):
+        self.phases = []
+
+    def init(self):
+        self.phases.append("init")
+
+    def transfer(self, framebuffer: bytes):
+        self.phases.append("transfer")
+
+    def refresh(self):
+        self.phases.append("refresh")
+
+    def sleep(self):
+        self.phases.append("sleep")
+
+
+@pytest.fixture
+def running_broker(tmp_path):
+    socket_path = str(tmp_path / "hardware.sock")
+    hardware = broker.HardwareBroker(CountingInterface(), RecordingDisplay(), 60.0)
+    with broker._Server(socket_path, broker._Handler) as server:
+        server.broker = hardware
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield socket_path, hardware
+        server.shutdown()
+        thread.join()
+
+
+def test_stale_socket_is_not_a_running_broker(tmp_path):
+    socket_path = str(tmp_path / "hardware.sock")
+    assert not broker.broker_running(socket_path)
+
+    # A broker that died leaves its socket file behind
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(socket_path)
+    sock.close()
+    assert not broker.broker_running(socket_path)
+
+
+def test_reads_are_cached_unless_fresh(running_broker):
+    socket_path, hardware = running_broker
+    assert broker.broker_running(socket_path)
+    charge = REGISTERS["CHARGE_LEVEL"]
+
+    cached = broker.BrokerInterface(socket_path)
+    first = cached.ReadData(charge.cmd, charge.length)
+    assert first["error"] == "NO_ERROR"
+    assert cached.ReadMany([(charge.cmd, charge.length)] * 2) == [first, first]
+    assert hardware._interface.reads == 1
+
+    fresh = broker.BrokerInterface(socket_path, fresh=True)
+    fresh.ReadData(charge.cmd, charge.length)
+    assert hardware._interface.reads == 2
+
+
+def test_display_is_held_from_init_to_sleep():
+    hardware = broker.HardwareBroker(None, RecordingDisplay())
+    first, second = {}, {}
+    hardware.handle({"op": "display", "phase": "init"}, first)
+    assert hardware.handle({"op": "display", "phase": "refresh"}, second) == {
+        "error": "DISPLAY_NOT_INITIALIZED"
+    }
+
+    waiting = threading.Thread(
+        target=hardware.handle, args=({"op": "display", "phase": "init"}, second)
+    )
+    waiting.start()
+    waiting.join(timeout=0.1)
+    assert waiting.is_alive()
+
+    hardware.handle({"op": "display", "phase": "sleep"}, first)
+    waiting.join(timeout=1)
+    assert not waiting.is_alive()
+    assert hardware._display.phases == ["init", "sleep", "init"]
+    hardware.release_display(second)
+
+
+def test_broker_display_shares_the_panel_digest():
+    assert broker.BrokerDisplay.name == display.Epd7in3e.name
@@ -0,0 +1,56 @@
+import asyncio
+
+from piframe.app import configurator_backend
+from piframe.app.configurator_backend import PowerSampler, PowerStatus
+
+
+def plugged_in(level: float) -> PowerStatus:
+    return PowerStatus(
+        is_battery_powered=False,
+        battery_level=level,
+        power_status_string="Plugged in",
+    )
+
+
+async def _sample_once(sampler: PowerSampler):
+    task = asyncio.create_task(sampler.run())
+    await asyncio.sleep(0.05)
+    task.cancel()
+
+
+def test_failed_reads_report_unavailable(monkeypatch):
+    def read_power_status():
+        raise OSError("bus error")
+
+    monkeypatch.setattr(configurator_backend, "read_power_status", read_power_status)
+
+    async def main():
+        sampler = PowerSampler(interval=0.01)
+        await _sample_once(sampler)
+        status, _ = await asyncio.wait_for(sampler.current(), 1)
+        return status
+
+    status = asyncio.run(main())
+    assert status.power_status_string == "Unavailable"
+    assert status.battery_level is None
+
+
+def test_change_before_waiting_is_not_lost(monkeypatch):
+    levels = iter([0.5, 0.4])
+    monkeypatch.setattr(
+        configurator_backend, "read_power_status", lambda: plugged_in(next(levels))
+    )
+
+    async def main():
+        sampler = PowerSampler(interval=1)
+        await _sample_once(sampler)
+        status, version = await sampler.current()
+        # The status changes before the client starts waiting
+        await _sample_once(sampler)
+        await asyncio.wait_for(sampler.wait_for_change(version), 1)
+        changed, _ = await sampler.current()
+        return status, changed
+
+    status, changed = asyncio.run(main())
+    assert status.battery_level == 0.5
+    assert changed.battery_level == 0.4
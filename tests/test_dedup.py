@@ -0,0 +1,65 @@
+import random
+
+from piframe.dedup import DescriptionIndex, HashIndex
+
+
+def test_hash_index_finds_the_nearest_hash_within_the_distance():
+    rng = random.Random(0)
+    index = HashIndex(max_distance=6)
+    stored = [rng.getrandbits(64) for _ in range(500)]
+    for value in stored:
+        index.add(value)
+
+    query = stored[42] ^ 0b10110  # Three bits away
+    assert index.nearest(query) == (stored[42], 3)
+    assert index.nearest(stored[7]) == (stored[7], 0)
+    assert not index.is_duplicate(stored[42] ^ 0x7F)  # Seven bits away
+
+
+def test_hash_index_matches_a_linear_scan():
+    rng = random.Random(1)
+    index = HashIndex(max_distance=4)
+    stored = [rng.getrandbits(64) for _ in range(200)]
+    for value in stored:
+        index.add(value)
+    for _ in range(200):
+        query = rng.choice(stored) ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+        expected = min((value ^ query).bit_count() for value in stored)
+        assert index.nearest(query)[1] == expected
+
+
+def test_hash_index_drops_a_truncated_row(tmp_path):
+    path = tmp_path / "hashes.bin"
+    index = HashIndex(path=path)
+    index.add(0x0123456789ABCDEF)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")  # A crash mid-append
+
+    index = HashIndex(path=path)
+    assert len(index) == 1
+    index.add(0xFEDCBA9876543210)
+    assert HashIndex(path=path)._hashes == [0x0123456789ABCDEF, 0xFEDCBA9876543210]
+
+
+def test_description_index_flags_near_duplicates_only():
+    index = DescriptionIndex(threshold=0.5)
+    index.add("A lighthouse on a rocky cliff at sunset, waves crashing below.")
+    assert index.most_similar(
+        "A lighthouse on a rocky cliff at sunset, waves crashing far below."
+    )
+    assert index.most_similar("A fox asleep in a snowy forest under the moon.") is None
+
+
+def test_description_index_reloads_recent_signatures(tmp_path):
+    path = tmp_path / "descriptions.bin"
+    index = DescriptionIndex(path=path)
+    for text in ("A red kite over a meadow.", "Jellyfish drifting in the deep sea."):
+        index.add(text)
+    with open(path, "ab") as f:
+        f.write(b"\x00" * 10)
+
+    reloaded = DescriptionIndex(path=path, recent=1)
+    assert len(reloaded) == 1
+    assert reloaded.most_similar("Jellyfish drifting in the deep sea.") == 1.0
+    assert reloaded.most_similar("A red kite over a meadow.") is None
+    assert path.stat().st_size % (16 * 4 * 4) == 0
@@ -0,0 +1,83 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from piframe.hardware import display
+from piframe.hardware.virtual_display import VirtualDisplay
+
+
+def test_importing_config_leaves_the_panel_driver_alone(tmp_path):
+    # A driver that fails loudly if anything imports it
+    driver = tmp_path / "waveshare_epd"
+    driver.mkdir()
+    (driver / "__init__.py").write_text("raise RuntimeError('driver imported')\n")
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import piframe.config\n"
+            "from piframe.hardware import display\n"
+            "assert display.display_available",
+        ],
+        env={"PYTHONPATH": f"{tmp_path}:."},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_virtual_display_previews_outside_the_working_directory(tmp_path):
+    backend = VirtualDisplay()
+    assert backend._preview_path.is_absolute()
+
+    preview_path = tmp_path / "preview" / "frame.png"
+    backend = VirtualDisplay(preview_path=str(preview_path))
+    framebuffer = np.full(display.FRAMEBUFFER_SIZE, 0x11, dtype=np.uint8)
+    with display.DisplaySession(backend) as session:
+        session.display(framebuffer)
+    assert preview_path.exists()
+
+
+class FakeEpd:
+    busy_pin = 24
+
+    def __init__(self):
+        self.sent = []
+
+    def send_command(self, command):
+        self.sent.append(("command", command))
+
+    def send_data(self, data):
+        self.sent.append(("data", data))
+
+
+class FakeEpdConfig:
+    def __init__(self, busy_level):
+        self.busy_level = busy_level
+
+    def digital_read(self, pin):
+        return self.busy_level
+
+
+def test_refresh_sends_the_booster_setting_after_power_on():
+    backend = display.Epd7in3e()
+    backend._epd, backend._epdconfig = FakeEpd(), FakeEpdConfig(busy_level=1)
+    backend.refresh()
+    assert backend._epd.sent[:7] == [
+        ("command", 0x04),
+        ("command", 0x06),
+        ("data", 0x6F),
+        ("data", 0x1F),
+        ("data", 0x17),
+        ("data", 0x49),
+        ("command", 0x12),
+    ]
+
+
+def test_refresh_gives_up_on_a_panel_stuck_busy():
+    backend = display.Epd7in3e(busy_timeout=0.05)
+    backend._epd, backend._epdconfig = FakeEpd(), FakeEpdConfig(busy_level=0)
+    with pytest.raises(TimeoutError):
+        backend.refresh()
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from piframe.energy import EnergySampler
+from piframe.journal import RunJournal
+
+
+def sampled(samples: list[tuple[float, float]]) -> EnergySampler:
+    sampler = EnergySampler(lambda: None)
+    for sampled_at, watts in samples:
+        sampler._times.append(sampled_at)
+        sampler._watts.append(watts)
+    return sampler
+
+
+def test_energy_is_the_trapezoidal_integral_of_power():
+    sampler = sampled([(0.0, 1.0), (2.0, 3.0), (4.0, 3.0)])
+    # 2 s ramping from 1 W to 3 W, then 2 s at 3 W
+    assert sampler.energy_j(0.0, 4.0) == pytest.approx(4.0 + 6.0)
+
+
+def test_power_is_interpolated_at_the_edges_and_held_past_the_samples():
+    sampler = sampled([(0.0, 1.0), (2.0, 3.0)])
+    # 2 W at 1 s, rising to 3 W at 2 s, then held at 3 W
+    assert sampler.energy_j(1.0, 3.0) == pytest.approx(2.5 + 3.0)
+    assert sampler.energy_j(-1.0, 0.0) == pytest.approx(1.0)
+
+
+def test_no_energy_without_samples_or_time():
+    assert sampled([]).energy_j(0.0, 1.0) is None
+    assert sampled([(0.0, 1.0)]).energy_j(1.0, 1.0) is None
+
+
+def test_annotate_adds_stage_and_run_energy():
+    sampler = sampled([(0.0, 2.0), (10.0, 2.0)])
+    sampler.started_at, sampler.stopped_at = 0.0, 10.0
+    journal = RunJournal()
+    journal.stages = [
+        {"stage": "description", "started_at": 1.0, "ended_at": 3.0},
+        {"stage": "render", "started_at": 5.0, "ended_at": 9.5},
+    ]
+    sampler.annotate(journal)
+    assert [stage["energy_j"] for stage in journal.stages] == [4.0, 9.0]
+    assert journal.metrics["energy_j"] == 20.0
+    assert journal.metrics["energy_samples"] == 2
+
+
+def test_failed_reads_are_skipped():
+    readings = iter([1.5, None, RuntimeError("bus busy"), 2.5])
+
+    def read():
+        reading = next(readings, 2.5)
+        if isinstance(reading, Exception):
+            raise reading
+        return reading
+
+    with EnergySampler(read, interval=0.001) as sampler:
+        while len(sampler._watts) < 3:
+            time.sleep(0.001)
+    assert sampler._watts[:2] == [1.5, 2.5]
+    assert sampler.stopped_at >= sampler.started_at
@@ -0,0 +1,25 @@
+import numpy as np
+from PIL import Image
+
+from piframe import image_utils
+from piframe.hardware import display
+
+
+def test_lut_lookup_matches_search_at_bin_centers():
+    levels = 48
+    lut = image_utils.build_palette_lut(display.PALETTE, levels)
+    centers = (np.arange(levels) + 0.5) * (256 / levels)
+    pixels = np.stack(
+        np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1
+    ).astype(np.float32)
+    assert np.array_equal(image_utils._nearest_color(pixels, display.PALETTE, lut), lut)
+
+
+def test_diffusion_framebuffer_does_not_load_the_lut(monkeypatch):
+    def palette_lut():
+        raise AssertionError("diffusion does not use the lookup table")
+
+    monkeypatch.setattr(display, "palette_lut", palette_lut)
+    image = Image.new("RGB", (display.WIDTH, display.HEIGHT), (200, 40, 40))
+    framebuffer = display.get_framebuffer(image, dither="diffusion")
+    assert framebuffer.size == display.FRAMEBUFFER_SIZE
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from piframe.journal import JOURNAL_NAME, RunJournal
+
+
+def test_stages_are_recorded_in_order_even_when_they_fail():
+    journal = RunJournal()
+    with journal.stage("description"):
+        pass
+    with pytest.raises(ValueError):
+        with journal.stage("image_generation"):
+            raise ValueError("no image")
+
+    assert [stage["stage"] for stage in journal.stages] == [
+        "description",
+        "image_generation",
+    ]
+    for stage in journal.stages:
+        assert stage["duration_s"] >= 0
+        assert stage["ended_at"] >= stage["started_at"]
+        assert stage["peak_rss_kb"] > 0
+
+
+def test_stages_over_the_memory_warning_are_flagged():
+    journal = RunJournal(memory_warning_mb=1)
+    with journal.stage("overlay"):
+        pass
+    assert journal.stages[0]["over_memory_warning"]
+
+    journal = RunJournal()
+    with journal.stage("overlay"):
+        pass
+    assert "over_memory_warning" not in journal.stages[0]
+
+
+def test_trace_memory_lists_allocation_sites():
+    journal = RunJournal(trace_memory=True, top_allocations=2)
+    with journal.stage("decode"):
+        buffer = bytearray(4 * 1024 * 1024)
+    assert journal.stages[0]["tracemalloc_peak_kb"] >= 4 * 1024
+    assert len(journal.stages[0]["top_allocations"]) == 2
+    del buffer
+
+
+def test_each_wake_appends_one_line(tmp_path):
+    for battery_level in (0.9, 0.8):
+        journal = RunJournal()
+        with journal.stage("render"):
+            pass
+        journal.record(battery_level=battery_level)
+        journal.write(str(tmp_path))
+
+    with open(tmp_path / JOURNAL_NAME) as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["metrics"]["battery_level"] for entry in entries] == [0.9, 0.8]
+    assert entries[0]["stages"][0]["stage"] == "render"
@@ -0,0 +1,95 @@
+import pytest
+
+from piframe.hardware import pijuice, pijuice_registers
+from piframe.hardware.pijuice import I2C_TIMEOUT, PiJuice, PiJuiceInterface
+from piframe.hardware.pijuice_sim import SimulatedPiJuice
+
+
+class FakeSMBus:
+    def __init__(self, bus):
+        self.bus = bus
+
+
+def test_bus_timeout_is_set_on_the_adapter(monkeypatch):
+    opened, ioctls, closed = [], [], []
+    monkeypatch.setattr(pijuice, "SMBus", FakeSMBus)
+    monkeypatch.setattr(
+        pijuice.os, "open", lambda path, flags: opened.append(path) or 42
+    )
+    monkeypatch.setattr(pijuice.os, "close", closed.append)
+    monkeypatch.setattr(
+        pijuice.fcntl,
+        "ioctl",
+        lambda fd, request, arg: ioctls.append((fd, request, arg)),
+    )
+
+    PiJuiceInterface(bus=1, timeout=0.1)
+
+    assert opened == ["/dev/i2c-1"]
+    assert ioctls == [(42, I2C_TIMEOUT, 10)]
+    assert closed == [42]
+
+
+@pytest.mark.parametrize(
+    "state",
+    [
+        dict(battery_current_ma=-250, temperature_c=25),
+        dict(battery_current_ma=1200, temperature_c=-12, battery_voltage_mv=4190),
+        dict(charge_level=3, battery="NORMAL", power_input="NOT_PRESENT"),
+    ],
+)
+def test_snapshot_matches_the_register_getters(state):
+    status = PiJuice(i2cbus=SimulatedPiJuice(**state)).status
+    snapshot = status.GetSnapshot()["data"]
+    flags = status.GetStatus()["data"]
+    assert snapshot.battery == flags["battery"]
+    assert snapshot.power_input == flags["powerInput"]
+    assert snapshot.charge_level == status.GetChargeLevel()["data"]
+    assert snapshot.temperature_c == status.GetBatteryTemperature()["data"]
+    assert snapshot.voltage_mv == status.GetBatteryVoltage()["data"]
+    assert snapshot.current_ma == status.GetBatteryCurrent()["data"]
+    assert snapshot.io_voltage_mv == status.GetIoVoltage()["data"]
+    assert snapshot.io_current_ma == status.GetIoCurrent()["data"]
+
+
+class FlakyBus(SimulatedPiJuice):
+    """Corrupts the given number of reads of each listed command."""
+
+    def __init__(self, failures: dict[int, int], **state):
+        super().__init__(**state)
+        self.failures = dict(failures)
+
+    def read_i2c_block_data(self, addr, cmd, length):
+        if self.failures.get(cmd):
+            self.failures[cmd] -= 1
+            # A corrupted checksum, which unlike a bus error leaves no backoff
+            return [0x00] * (length - 1) + [0x00]
+        return super().read_i2c_block_data(addr, cmd, length)
+
+
+def test_snapshot_retries_a_failed_register():
+    status = PiJuice(i2cbus=FlakyBus({0x49: 1}, battery_voltage_mv=3800)).status
+    snapshot = status.GetSnapshot()["data"]
+    assert snapshot.voltage_mv == 3800
+    assert snapshot.errors == ()
+
+
+def test_snapshot_keeps_the_fields_that_were_read():
+    status = PiJuice(i2cbus=FlakyBus({0x49: 5}, charge_level=64)).status
+    snapshot = status.GetSnapshot()["data"]
+    assert snapshot.voltage_mv is None
+    assert snapshot.charge_level == 64
+    assert snapshot.errors == (("BATTERY_VOLTAGE", "DATA_CORRUPTED"),)
+
+
+def test_battery_profile_format_matches_the_profile_fields():
+    pj = PiJuice(i2cbus=SimulatedPiJuice())
+    register = pijuice_registers.REGISTERS["BATTERY_PROFILE"]
+    raw = pj.interface.ReadData(register.cmd, register.length)["data"]
+    *_, temp_hot, ntc_b, ntc_resistance = register.decode(raw)
+    profile = pj.config.GetBatteryProfile()["data"]
+    assert (temp_hot, ntc_b, ntc_resistance * 10) == (
+        profile["tempHot"],
+        profile["ntcB"],
+        profile["ntcResistance"],
+    )
@@ -0,0 +1,62 @@
+import json
+import threading
+
+from piframe.hardware.pijuice import PiJuiceInterface
+from piframe.hardware.pijuice_cache import CachedInterface
+from piframe.hardware.pijuice_registers import REGISTERS
+from piframe.hardware.pijuice_sim import SimulatedPiJuice
+
+
+def test_concurrent_saves_leave_a_whole_cache(tmp_path):
+    path = tmp_path / "pijuice_static.json"
+    profile = REGISTERS["BATTERY_PROFILE"]
+    caches = [
+        CachedInterface(PiJuiceInterface(i2cbus=SimulatedPiJuice()), path=path)
+        for _ in range(8)
+    ]
+    threads = [
+        threading.Thread(target=cache.ReadData, args=(profile.cmd, profile.length))
+        for cache in caches
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path) as f:
+        assert f"{profile.cmd}:{profile.length}" in json.load(f)["registers"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "pijuice_static.json",
+        "pijuice_static.lock",
+    ]
+
+
+def test_changes_from_another_process_are_read_back(tmp_path):
+    path = tmp_path / "pijuice_static.json"
+    profile = REGISTERS["BATTERY_PROFILE"]
+    key = f"{profile.cmd}:{profile.length}"
+    ours = CachedInterface(PiJuiceInterface(i2cbus=SimulatedPiJuice()), path=path)
+    theirs = CachedInterface(PiJuiceInterface(i2cbus=SimulatedPiJuice()), path=path)
+
+    ours.ReadData(profile.cmd, profile.length)
+    theirs.WriteData(profile.cmd, [0] * profile.length)
+    assert key not in ours._verified()["registers"]
+
+    # Another key cached meanwhile is kept when ours saves
+    theirs._update(lambda cache: cache["registers"].update({"999:1": [1]}))
+    ours.ReadData(profile.cmd, profile.length)
+    with open(path) as f:
+        assert set(json.load(f)["registers"]) == {key, "999:1"}
+
+
+def test_verification_expires_while_running(tmp_path):
+    path = tmp_path / "pijuice_static.json"
+    profile = REGISTERS["BATTERY_PROFILE"]
+    interface = PiJuiceInterface(i2cbus=SimulatedPiJuice())
+    cache = CachedInterface(interface, path=path, verify_interval=3600)
+    cache.ReadData(profile.cmd, profile.length)
+
+    # A firmware update found at the next check drops the cached registers
+    cache._update(lambda cache: cache.update(verified_at=0, firmware=[0, 0]))
+    cache._update(lambda cache: cache["registers"].update({"999:1": [1]}))
+    assert "999:1" not in cache._verified()["registers"]
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+
+from piframe.hardware import power
+from piframe.hardware.pijuice import PiJuice
+from piframe.hardware.pijuice_sim import SimulatedPiJuice
+
+RTC_ALARM_CMD = 0xB9
+
+
+@pytest.fixture
+def simulated(monkeypatch):
+    bus = SimulatedPiJuice()
+    pijuice = PiJuice(i2cbus=bus)
+    monkeypatch.setattr(power.PIJUICE, "_pijuice", pijuice)
+    alarms = []
+    set_alarm = pijuice.rtcAlarm.SetAlarm
+
+    def record(alarm):
+        alarms.append(alarm)
+        return set_alarm(alarm)
+
+    monkeypatch.setattr(pijuice.rtcAlarm, "SetAlarm", record)
+    return bus, alarms
+
+
+def test_alarm_within_a_day_repeats_daily(simulated):
+    bus, alarms = simulated
+    power.set_alarm(datetime(2026, 10, 20, 7, 30), now=datetime(2026, 10, 19, 8, 0))
+    assert alarms == [{"hour": 7, "minute": 30}]
+    # Bit 7 of the day byte marks an every-day alarm
+    assert bus._registers[RTC_ALARM_CMD][3] & 0x80
+
+
+def test_alarm_days_away_is_pinned_to_its_day(simulated):
+    bus, alarms = simulated
+    power.set_alarm(datetime(2026, 10, 22, 8, 0), now=datetime(2026, 10, 19, 8, 0))
+    assert alarms == [{"hour": 8, "minute": 0, "day": 22}]
+    day = bus._registers[RTC_ALARM_CMD][3]
+    assert not day & 0x80
+    assert (day >> 4) * 10 + (day & 0x0F) == 22
+
+
+def test_alarm_write_is_retried_after_a_bus_error(simulated, monkeypatch):
+    bus, alarms = simulated
+    monkeypatch.setattr(power, "WRITE_RETRY_DELAY", 0)
+    pijuice = power.PIJUICE.get()
+    set_alarm = pijuice.rtcAlarm.SetAlarm
+    results = iter([{"error": "COMMUNICATION_ERROR"}])
+    monkeypatch.setattr(
+        pijuice.rtcAlarm,
+        "SetAlarm",
+        lambda alarm: next(results, None) or set_alarm(alarm),
+    )
+    assert power.set_alarm(
+        datetime(2026, 10, 20, 7, 30), now=datetime(2026, 10, 19, 8, 0)
+    )
+    assert alarms == [{"hour": 7, "minute": 30}]
+
+
+def test_shutdown_does_not_halt_without_power_off(simulated, monkeypatch):
+    halted = []
+    monkeypatch.setattr(power, "WRITE_RETRY_DELAY", 0)
+    monkeypatch.setattr(power.os, "system", halted.append)
+    monkeypatch.setattr(
+        power.PIJUICE.get().power,
+        "SetPowerOff",
+        lambda delay: {"error": "COMMUNICATION_ERROR"},
+    )
+    assert not power.shutdown()
+    assert halted == []
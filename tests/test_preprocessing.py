@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from piframe import preprocessing
+
+
+def _image() -> Image.Image:
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:120, 0:200]
+    pixels = np.stack([x * 1.2, y * 2, (x + y) % 256], axis=-1)
+    pixels = pixels + rng.normal(0, 20, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+@pytest.mark.parametrize(
+    "stages",
+    [
+        [preprocessing.Gamma(0.8), preprocessing.PaletteToneMap()],
+        [preprocessing.PaletteToneMap(), preprocessing.Gamma(1.3)],
+    ],
+)
+def test_fused_curves_stay_close_to_unfused(stages):
+    image = _image()
+    fused = np.asarray(preprocessing.Pipeline(stages).apply(image), dtype=float)
+    unfused = image
+    for stage in stages:
+        unfused = preprocessing.Pipeline([stage]).apply(unfused)
+    difference = np.abs(fused - np.asarray(unfused, dtype=float))
+    # Pushing the luma histogram through per-channel curves is approximate
+    assert difference.mean() < 3
+    assert difference.max() <= 8
@@ -0,0 +1,145 @@
+import json
+
+import pytest
+
+from piframe.models import Model
+from piframe.prompts import (
+    PromptContext,
+    ShuffleBagAdlib,
+    TopicStrategy,
+    _feistel_permute,
+    estimate_tokens,
+    fingerprint,
+    image_description_prompt,
+)
+
+
+@pytest.mark.parametrize(
+    "description, expected",
+    [
+        (
+            "Three wizards eating burnt pizza in a tiny kitchen.",
+            "three wizards eating burnt / tiny kitchen",
+        ),
+        (
+            "A stormy sky over three wizards eating burnt pizza in a tiny kitchen.",
+            "stormy sky three wizards / tiny kitchen",
+        ),
+        (
+            "Under a stormy sky, three wizards eat burnt pizza in a tiny kitchen.",
+            "three wizards eat burnt / stormy sky",
+        ),
+        (
+            "A knight among three dragons at the edge of a cliff.",
+            "knight three dragons / edge cliff",
+        ),
+        ("Three cats playing chess in space.", "three cats playing chess / space"),
+        ("Robots dancing.", "robots dancing"),
+    ],
+)
+def test_fingerprint_splits_subject_and_setting(description, expected):
+    assert fingerprint(description) == expected
+
+
+def test_fingerprint_adds_the_style_from_the_image_prompt():
+    description = "Robots dancing in a disco."
+    prompt = "Robots dancing in a disco. Pixel Art, colorful"
+    assert fingerprint(description, prompt) == "robots dancing / disco / Pixel Art"
+
+
+class CharacterModel(Model[str]):
+    chars_per_token = 2.0
+
+    def invoke(self, messages):
+        return ""
+
+
+def test_models_estimate_tokens_with_their_own_ratio():
+    assert CharacterModel("m").estimate_tokens("abcde") == estimate_tokens("abcde", 2.0)
+    assert estimate_tokens("abcde") == 2
+
+
+def test_model_args_set_the_token_estimate_and_budget():
+    model = CharacterModel("m", chars_per_token=5.0, prompt_tokens=100, max_tokens=9)
+    assert (model.chars_per_token, model.prompt_tokens) == (5.0, 100)
+    assert model._model_args == {"max_tokens": 9}
+    assert CharacterModel("m").prompt_tokens == Model.prompt_tokens
+
+
+class FixedTopic(TopicStrategy):
+    def get_topic(self, context):
+        return "a cat"
+
+
+def test_history_fills_the_description_model_budget():
+    history = [f"subject {i} / setting {i}" for i in range(20)]
+    context = PromptContext(weather=None, battery_level=1.0, history=history)
+    included = {}
+    for chars_per_token in (2.0, 4.0):
+        model = CharacterModel("m", chars_per_token=chars_per_token, prompt_tokens=500)
+        prompt = image_description_prompt(
+            FixedTopic(),
+            context,
+            token_budget=model.prompt_tokens,
+            count_tokens=model.estimate_tokens,
+        )
+        assert model.estimate_tokens(prompt) <= 500
+        included[chars_per_token] = sum(entry in prompt for entry in history)
+    # A model with more characters per token fits more of the same history
+    assert 0 < included[2.0] < included[4.0]
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 1000])
+def test_feistel_permute_is_a_permutation(size):
+    key = 0x5EED
+    assert sorted(_feistel_permute(i, size, key) for i in range(size)) == list(
+        range(size)
+    )
+
+
+def test_feistel_permute_order_depends_on_the_key():
+    orders = {
+        tuple(_feistel_permute(i, 100, key) for i in range(100)) for key in range(5)
+    }
+    assert len(orders) == 5
+
+
+def draw(bag: ShuffleBagAdlib, count: int) -> list[str]:
+    context = PromptContext(weather=None, battery_level=1.0, history=[])
+    return [bag.get_topic(context) for _ in range(count)]
+
+
+def test_shuffle_bag_draws_every_combination_once_across_wakes(tmp_path):
+    state_path = tmp_path / "shuffle_bag.json"
+    vocabulary = dict(adjectives=["red", "blue", "green"], nouns=["fox", "owl"])
+
+    # A fresh strategy per wake, as update-frame loads it
+    topics = [
+        draw(ShuffleBagAdlib(**vocabulary, state_path=str(state_path)), 1)[0]
+        for _ in range(6)
+    ]
+    assert sorted(topics) == sorted(
+        f"{adjective} {noun}"
+        for adjective in vocabulary["adjectives"]
+        for noun in vocabulary["nouns"]
+    )
+    with open(state_path) as f:
+        assert json.load(f)["position"] == 6
+
+    # The emptied bag refills with every combination again
+    bag = ShuffleBagAdlib(**vocabulary, state_path=str(state_path))
+    assert sorted(draw(bag, 6)) == sorted(topics)
+
+
+def test_shuffle_bag_restarts_when_the_vocabulary_changes(tmp_path):
+    state_path = tmp_path / "shuffle_bag.json"
+    draw(ShuffleBagAdlib(["red", "blue"], ["fox"], state_path=str(state_path)), 1)
+    bag = ShuffleBagAdlib(["red", "blue", "green"], ["fox"], state_path=str(state_path))
+    assert sorted(draw(bag, 3)) == ["blue fox", "green fox", "red fox"]
+
+
+def test_shuffle_bag_ignores_an_unreadable_state(tmp_path):
+    state_path = tmp_path / "shuffle_bag.json"
+    state_path.write_text('{"seed": 1, "posit')
+    bag = ShuffleBagAdlib(["red"], ["fox", "owl"], state_path=str(state_path))
+    assert sorted(draw(bag, 2)) == ["red fox", "red owl"]
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from piframe.schedule import (
+    PowerBudget,
+    QualityTier,
+    measure_sleep_power,
+    off_charger_since,
+    plan_wakeup,
+)
+
+NOW = datetime(2026, 3, 2, 8, 30)
+HOURLY = "0 * * * *"
+
+
+def budget(**settings) -> PowerBudget:
+    return PowerBudget(**{"target_runtime_hours": 24, **settings})
+
+
+def plan(schedule=HOURLY, charge=0.5, wake_energy_j=250.0, **settings):
+    return plan_wakeup(
+        schedule,
+        budget(**settings),
+        charge=charge,
+        capacity_j=10_000.0,
+        wake_energy_j=wake_energy_j,
+        sleep_power_w=0.0,
+        off_charger_at=NOW,
+        now=NOW,
+    )
+
+
+def test_affordable_schedule_is_followed():
+    wake_plan = plan(wake_energy_j=1.0)
+    assert wake_plan.wakeup == datetime(2026, 3, 2, 9)
+    assert wake_plan.skipped == 0
+
+
+def test_wakes_are_skipped_evenly_when_the_charge_runs_short():
+    # 4500 J above the reserve pays for 18 of the 72 wakes in the horizon
+    wake_plan = plan()
+    assert (wake_plan.affordable_wakes, wake_plan.scheduled_wakes) == (18.0, 72)
+    assert wake_plan.skipped == 3
+    assert wake_plan.wakeup == datetime(2026, 3, 2, 12)
+
+
+def test_skipping_never_waits_past_the_max_interval():
+    wake_plan = plan(charge=0.06, max_interval_hours=6)
+    assert wake_plan.wakeup == NOW.replace(minute=0) + timedelta(hours=6)
+    assert wake_plan.skipped == 5
+
+
+def test_horizon_shrinks_to_the_max_interval_past_the_target_runtime():
+    wake_plan = plan_wakeup(
+        HOURLY,
+        budget(max_interval_hours=12),
+        charge=0.5,
+        capacity_j=10_000.0,
+        wake_energy_j=250.0,
+        sleep_power_w=0.0,
+        off_charger_at=NOW - timedelta(days=3),
+        now=NOW,
+    )
+    assert wake_plan.scheduled_wakes == 12
+    assert wake_plan.skipped == 0
+
+
+def test_sparse_schedule_still_wakes_at_its_next_time():
+    # Sundays only, further off than the max interval
+    wake_plan = plan("0 9 * * 0", charge=0.06, max_interval_hours=24)
+    assert wake_plan.wakeup == datetime(2026, 3, 8, 9)
+    assert wake_plan.skipped == 0
+
+
+def test_cheapest_eligible_tier_is_selected():
+    tiers = [
+        QualityTier(name="economy", max_charge=0.5),
+        QualityTier(name="archive", max_charge=0.2, archived=True),
+    ]
+    power_budget = budget(tiers=tiers)
+    assert power_budget.select_tier(0.8) is None
+    assert power_budget.select_tier(0.4).name == "economy"
+    assert power_budget.select_tier(0.1).name == "archive"
+
+
+def battery_row(hours: float, level, on_battery: bool = True) -> dict:
+    source = "NOT_PRESENT" if on_battery else "PRESENT"
+    return {
+        "timestamp": (NOW + timedelta(hours=hours)).isoformat(),
+        "battery_level": "" if level is None else str(level),
+        "power_input": source,
+        "power_input_5v": source,
+    }
+
+
+def test_sleep_power_is_the_charge_lost_less_the_wakes():
+    log = [battery_row(0, 0.9), battery_row(10, 0.85), battery_row(20, 0.8)]
+    # 0.1 of 36 kJ over 20 hours, less two 500 J wakes
+    assert measure_sleep_power(log, 36_000.0, 500.0) == pytest.approx(
+        (3600.0 - 1000.0) / (20 * 3600)
+    )
+
+
+def test_sleep_power_skips_charging_and_unread_entries():
+    log = [
+        battery_row(0, 0.5, on_battery=False),
+        battery_row(1, 0.9),
+        battery_row(2, None),
+        battery_row(3, 0.8),
+        battery_row(4, 0.78),
+    ]
+    # Only the 0.8 to 0.78 step has both levels on battery
+    assert measure_sleep_power(log, 36_000.0, 0.0) == pytest.approx(720.0 / 3600)
+    assert measure_sleep_power([battery_row(0, 0.9)], 36_000.0, 0.0) is None
+
+
+def test_off_charger_since_the_last_entry_on_external_power():
+    log = [battery_row(0, 0.5, on_battery=False), battery_row(1, 0.9)]
+    assert off_charger_since(log) == NOW
+    assert off_charger_since(log[1:]) == NOW + timedelta(hours=1)
+    assert off_charger_since([]) is None
@@ -0,0 +1,57 @@
+import csv
+
+from piframe.app import update_frame
+from piframe.config import Config
+from piframe.journal import RunJournal
+
+
+def make_config(artifact_directory) -> Config:
+    return Config.model_validate(
+        {
+            "artifact_directory": str(artifact_directory),
+            "schedule": "0 9 * * *",
+            "description_model": {
+                "class_path": "piframe.models.BedrockModel",
+                "args": {},
+            },
+            "image_model": {"class_path": "piframe.models.StableApi", "args": {}},
+            "topic_strategy": {"class_path": "piframe.prompts.RandomAdlib", "args": {}},
+        }
+    )
+
+
+def test_failed_render_is_recorded_and_not_raised():
+    journal = RunJournal()
+
+    def draw():
+        raise TimeoutError("Display still busy after 60 seconds")
+
+    update_frame.render(journal, draw)
+    assert journal.metrics["display_refreshed"] is False
+    assert "TimeoutError" in journal.metrics["display_error"]
+    assert [stage["stage"] for stage in journal.stages] == ["render"]
+
+
+def test_render_records_the_display_phases():
+    journal = RunJournal()
+    update_frame.render(journal, lambda: {"refresh": 12.5})
+    assert journal.metrics["display_refreshed"] is True
+    assert journal.metrics["display_phases"] == {"refresh": 12.5}
+
+
+def test_description_index_is_seeded_from_the_log_once(tmp_path):
+    config = make_config(tmp_path)
+    with open(tmp_path / "piframe.log.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["timestamp", "description"])
+        writer.writeheader()
+        writer.writerow(
+            {"timestamp": "t1", "description": "A lighthouse on a cliff at dusk."}
+        )
+
+    index = update_frame.load_description_index(config)
+    assert len(index) == 1
+    assert index.most_similar("A lighthouse on a cliff at dusk.") == 1.0
+    index.add("Otters juggling oranges on a frozen lake.")
+
+    # Later wakes load the stored index instead of seeding it again
+    assert len(update_frame.load_description_index(config)) == 2
@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from piframe import weather
+from piframe.weather import CachedForecast, OpenMeteo
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, data: dict):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+def hourly(start: float, temperatures: list[float]) -> dict:
+    hour = start - start % 3600
+    return {
+        "hourly": {
+            "time": [hour + 3600 * i for i in range(len(temperatures))],
+            "temperature_2m": temperatures,
+            "weather_code": [0] * len(temperatures),
+        }
+    }
+
+
+class FakeGet:
+    """Stands in for requests.get, recording the timeout of each call."""
+
+    def __init__(self):
+        self.timeouts = []
+        self.response = None
+
+    def __call__(self, url, params, timeout):
+        self.timeouts.append(timeout)
+        if callable(self.response):
+            return self.response(params)
+        return self.response
+
+
+@pytest.fixture
+def requests_get(monkeypatch):
+    get = FakeGet()
+    monkeypatch.setattr(weather.requests, "get", get)
+    return get
+
+
+def test_open_meteo_gives_up_after_its_timeout(requests_get):
+    def time_out(params):
+        raise requests.Timeout("read timed out")
+
+    requests_get.response = time_out
+    assert OpenMeteo(timeout=2.5).get_weather() is None
+    assert requests_get.timeouts == [2.5]
+
+
+def write_forecast(path, fetched_at: float, temperatures: list[float], **location):
+    forecast = {
+        "latitude": location.get("latitude", weather.DEFAULT_LATITUDE),
+        "longitude": location.get("longitude", weather.DEFAULT_LONGITUDE),
+        "fetched_at": fetched_at,
+        "time": hourly(time.time(), temperatures)["hourly"]["time"],
+        "temperature": temperatures,
+        "weather_code": [0] * len(temperatures),
+    }
+    path.write_text(json.dumps(forecast))
+
+
+def test_fresh_forecast_is_served_without_fetching(tmp_path, requests_get):
+    cache_path = tmp_path / "forecast.json"
+    write_forecast(cache_path, time.time(), [61.0, 62.0])
+    assert CachedForecast(cache_path=str(cache_path)).get_weather().temperature == 61
+    assert requests_get.timeouts == []
+
+
+def test_stale_forecast_is_served_while_refetching(tmp_path, requests_get):
+    cache_path = tmp_path / "forecast.json"
+    write_forecast(cache_path, time.time() - 7 * 3600, [61.0, 62.0])
+    release = threading.Event()
+
+    def slow_fetch(params):
+        release.wait(5)
+        return FakeResponse(hourly(time.time(), [70.0, 71.0]))
+
+    requests_get.response = slow_fetch
+    provider = CachedForecast(cache_path=str(cache_path), ttl_hours=6)
+    assert provider.get_weather().temperature == 61
+    release.set()
+    provider._refresh.join()
+    assert provider.get_weather().temperature == 70
+
+
+def test_forecast_for_another_location_is_refetched(tmp_path, requests_get):
+    cache_path = tmp_path / "forecast.json"
+    write_forecast(cache_path, time.time(), [50.0], latitude=0.0, longitude=0.0)
+    requests_get.response = FakeResponse(hourly(time.time(), [65.0]))
+    assert CachedForecast(cache_path=str(cache_path)).get_weather().temperature == 65
+    assert json.loads(cache_path.read_text())["latitude"] == weather.DEFAULT_LATITUDE
+
+
+def test_failed_fetch_with_nothing_cached_gives_no_weather(tmp_path, requests_get):
+    def refuse(params):
+        raise requests.ConnectionError("no network")
+
+    requests_get.response = refuse
+    provider = CachedForecast(cache_path=str(tmp_path / "forecast.json"), timeout=1)
+    assert provider.get_weather() is None
+    assert requests_get.timeouts == [1]